@@ -23,11 +23,13 @@ import shutil
 import zipfile
 import json
 import random
-import csv
-import io
+import math
+import platform
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 import threading
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 # Telegram Bot API
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -48,7 +50,8 @@ from telethon.errors import (
 )
 
 # Database
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument, ReadPreference
+from pymongo.errors import BulkWriteError
 from bson import ObjectId
 
 # Collection module
@@ -93,6 +96,13 @@ class Config:
     PROXY_USERNAME = os.getenv('PROXY_USERNAME', '')
     PROXY_PASSWORD = os.getenv('PROXY_PASSWORD', '')
     
+    # Bot API HTTP connection pool (PTB defaults to a very small pool)
+    BOT_CONNECTION_POOL_SIZE = int(os.getenv('BOT_CONNECTION_POOL_SIZE', 256))
+    BOT_POOL_TIMEOUT = float(os.getenv('BOT_POOL_TIMEOUT', 30.0))
+    
+    # 采集功能开关（仅用于私信的部署可设为 0）
+    ENABLE_COLLECTION = bool(int(os.getenv('ENABLE_COLLECTION', '1')))
+    
     # Telegram API
     API_ID = os.getenv('API_ID', '')
     API_HASH = os.getenv('API_HASH', '')
@@ -120,6 +130,8 @@ class Config:
     AUTO_REFRESH_MAX_INTERVAL = 50
     AUTO_REFRESH_FAST_INTERVAL = 10
     AUTO_REFRESH_FAST_DURATION = 60
+    AUTO_REFRESH_BACKOFF_FACTOR = 1.5  # Interval multiplier while progress is unchanged
+    AUTO_REFRESH_IDLE_MAX_INTERVAL = 200  # Upper bound for the backed-off interval
     MAX_AUTO_REFRESH_ERRORS = 5
     ACCOUNT_CHECK_LOOP_INTERVAL = 10
     CONSECUTIVE_FAILURES_THRESHOLD = 50
@@ -321,6 +333,48 @@ async def safe_answer_query(query, text="", show_alert=False, timeout=5.0):
         logger.error(f"Unexpected error answering query: {e}")
 
 
+# 后台清理任务的强引用，防止任务在执行完成前被垃圾回收
+_background_cleanup_tasks = set()
+
+
+async def _cleanup_config_messages(bot, chat_id, message_ids):
+    """
+    删除配置会话产生的临时消息（提示、用户输入、确认提示）
+    
+    Args:
+        bot: Bot 实例
+        chat_id: 聊天 ID
+        message_ids: 待删除的消息 ID 列表，None 会被跳过
+    """
+    message_ids = [message_id for message_id in message_ids if message_id]
+    if not message_ids:
+        return
+    try:
+        # 一次请求批量删除，已不存在的消息会被 Telegram 自动跳过
+        await bot.delete_messages(chat_id=chat_id, message_ids=message_ids)
+    except Exception as e:
+        logger.debug(f"Failed to delete config messages {message_ids}: {e}")
+
+
+async def _delayed_cleanup(bot, chat_id, message_ids, delay=2.0):
+    """延迟一段时间后清理配置消息"""
+    await asyncio.sleep(delay)
+    await _cleanup_config_messages(bot, chat_id, message_ids)
+
+
+def _schedule_delayed_cleanup(bot, chat_id, message_ids, delay=2.0):
+    """
+    在后台调度配置消息清理，处理器无需等待即可立即返回
+    
+    Returns:
+        asyncio.Task: 已调度的清理任务
+    """
+    task = asyncio.create_task(_delayed_cleanup(bot, chat_id, message_ids, delay))
+    _background_cleanup_tasks.add(task)
+    task.add_done_callback(_background_cleanup_tasks.discard)
+    return task
+
+
 # Global cache for account spambot status checks (thread-safe)
 # Format: {account_id: {'status': 'active/limited/banned', 'checked_at': datetime}}
 account_status_cache = {}
@@ -468,7 +522,7 @@ class Account:
     def __init__(self, phone, session_name, status=None, api_id=None, api_hash=None,
                  messages_sent_today=0, total_messages_sent=0, last_used=None,
                  daily_limit=50, created_at=None, updated_at=None, proxy_id=None, 
-                 account_type='messaging', _id=None):
+                 account_type='messaging', session_format='session', _id=None):
         self._id = _id
         self.phone = phone
         self.session_name = session_name
@@ -481,6 +535,7 @@ class Account:
         self.daily_limit = daily_limit
         self.proxy_id = proxy_id  # Reference to Proxy document
         self.account_type = account_type  # 'messaging' or 'collection'
+        self.session_format = session_format  # 'session' or 'session+json'（入库时确定，供索引等值查询）
         self.created_at = created_at or datetime.utcnow()
         self.updated_at = updated_at or datetime.utcnow()
     
@@ -498,6 +553,7 @@ class Account:
             'daily_limit': self.daily_limit,
             'proxy_id': self.proxy_id,
             'account_type': self.account_type,
+            'session_format': self.session_format,
             'created_at': self.created_at,
             'updated_at': self.updated_at
         }
@@ -522,6 +578,7 @@ class Account:
             daily_limit=doc.get('daily_limit', 50),
             proxy_id=doc.get('proxy_id'),
             account_type=doc.get('account_type', 'messaging'),
+            session_format=doc.get('session_format', 'session'),
             created_at=doc.get('created_at'),
             updated_at=doc.get('updated_at'),
             _id=doc.get('_id')
@@ -938,6 +995,8 @@ def init_db(mongodb_uri, database_name):
     db[Account.COLLECTION_NAME].create_index('status')
     db[Account.COLLECTION_NAME].create_index('proxy_id')
     db[Account.COLLECTION_NAME].create_index('account_type')
+    # 采集菜单按 账户类型 + 状态 + session 格式 等值过滤
+    db[Account.COLLECTION_NAME].create_index([('account_type', 1), ('status', 1), ('session_format', 1)])
     
     db[Task.COLLECTION_NAME].create_index('status')
     db[Task.COLLECTION_NAME].create_index('account_id')
@@ -947,6 +1006,7 @@ def init_db(mongodb_uri, database_name):
     db[Target.COLLECTION_NAME].create_index([('task_id', 1), ('is_sent', 1)])
     
     db[MessageLog.COLLECTION_NAME].create_index('task_id')
+    db[MessageLog.COLLECTION_NAME].create_index([('task_id', 1), ('success', 1)])
     db[MessageLog.COLLECTION_NAME].create_index('account_id')
     db[MessageLog.COLLECTION_NAME].create_index('sent_at')
     
@@ -954,7 +1014,8 @@ def init_db(mongodb_uri, database_name):
     db[Proxy.COLLECTION_NAME].create_index([('host', 1), ('port', 1)])
     
     # Initialize collection indexes
-    init_collection_indexes(db)
+    if Config.ENABLE_COLLECTION:
+        init_collection_indexes(db)
     
     return db
 
@@ -965,6 +1026,30 @@ def get_db_client(mongodb_uri, database_name):
     return client[database_name]
 
 
+def count_by_field(collection, field):
+    """
+    按字段分组统计文档数量（单次聚合查询）
+    
+    Args:
+        collection: MongoDB 集合
+        field: 分组字段名
+        
+    Returns:
+        dict: {字段值: 文档数}，总数可通过 sum(counts.values()) 获得
+    """
+    pipeline = [{'$group': {'_id': f'${field}', 'count': {'$sum': 1}}}]
+    return {doc['_id']: doc['count'] for doc in collection.aggregate(pipeline)}
+
+
+def secondary_preferred(collection):
+    """
+    返回优先从副本集从节点读取的集合句柄（用于统计面板等可容忍轻微延迟的只读查询）
+    
+    单节点部署时自动回退到主节点，行为不变。
+    """
+    return collection.with_options(read_preference=ReadPreference.SECONDARY_PREFERRED)
+
+
 # ============================================================================
 # 代理管理函数
 # ============================================================================
@@ -1364,6 +1449,131 @@ def format_log_entry(log: dict, max_target_len: int = None, max_msg_len: int = N
     return time_str, status_emoji, target, message
 
 
+# Pre-built 20-cell progress bars, one per 5% step (index = filled cells)
+_PROGRESS_BARS = tuple('█' * i + '░' * (20 - i) for i in range(21))
+
+# Progress message layout shared by the auto-refresh loop and the refresh button
+_PROGRESS_TEMPLATE = (
+    "🚀 <b>正在私信中</b>\n\n"
+    "📊 <b>进度统计</b>\n"
+    "━━━━━━━━━━━━━━━━\n"
+    "进度: {processed}/{total} ({progress_percent:.1f}%)\n"
+    "<code>{progress_bar}</code>\n\n"
+    "⏱️ <b>时间统计</b>\n"
+    "• 已运行: {runtime_str}\n"
+    "• 预计剩余: {remaining_str}\n"
+    "• 发送速度: {speed_str}\n"
+    "{account_section}\n"
+    "📈 <b>发送统计</b>\n"
+    "• ✅ 成功: {sent}\n"
+    "• ❌ 失败: {failed}\n"
+    "• ⏸️ 待发送: {pending}\n"
+    "{logs_section}"
+)
+
+# Fields the progress views actually read - avoids pulling message bodies etc. on every tick
+_PROGRESS_PROJECTION = {
+    'name': 1, 'status': 1, 'total_targets': 1, 'sent_count': 1, 'failed_count': 1,
+    'started_at': 1, 'completed_at': 1, 'pin_message': 1, 'delete_dialog': 1, 'repeat_send': 1
+}
+
+
+def _render_account_section(account_info):
+    """Render the current-account block of the progress message"""
+    if not account_info:
+        return ""
+    masked_phone = mask_phone_number(account_info['phone'])
+    remaining_quota = max(0, account_info['daily_limit'] - account_info['sent_today'])
+    return (
+        f"\n📱 <b>当前账号</b>\n"
+        f"• 账号: {masked_phone}\n"
+        f"• 今日已发: {account_info['sent_today']} 条\n"
+        f"• 剩余配额: {remaining_quota} 条\n"
+    )
+
+
+def _render_logs_section(recent_logs):
+    """Render the recent-operations block of the progress message (newest first)"""
+    if not recent_logs:
+        return ""
+    log_lines = []
+    for log in reversed(recent_logs):
+        time_str, status_emoji, target, message = format_log_entry(log)
+        log_lines.append(f"{time_str} {status_emoji} {target} {message}\n")
+    return "\n📝 <b>最近操作</b>\n━━━━━━━━━━━━━━━━\n" + ''.join(log_lines)
+
+
+def _fmt_hms(total_seconds, default="计算中..."):
+    """Format seconds as HH:MM:SS; NaN/inf falls back to ``default``, negatives clamp to 0"""
+    if not math.isfinite(total_seconds):
+        return default
+    hours, remainder = divmod(max(0, int(total_seconds)), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def _render_progress_text(sent, failed, total, started_at, account_section, logs_section, now=None):
+    """
+    渲染任务进度消息（自动刷新与手动刷新共用）
+    
+    Args:
+        sent / failed / total: 任务计数
+        started_at: 任务开始时间（可为 naive UTC）
+        account_section / logs_section: 预先渲染好的账号与日志区块
+        now: 当前 UTC 时间（调用方已取得时传入，避免重复读取时钟）
+        
+    Returns:
+        str: HTML 格式的进度文本
+    """
+    processed = sent + failed
+    progress_percent = min(100.0, processed / total * 100) if total > 0 else 0.0
+    
+    # 计算时间和速度
+    runtime_str = "00:00:00"
+    speed_str = "计算中..."
+    remaining_str = "计算中..."
+    
+    if started_at:
+        # 确保时区一致 - Fix Bug 1
+        if started_at.tzinfo is None:
+            started_at = started_at.replace(tzinfo=timezone.utc)
+        
+        runtime_seconds = ((now or datetime.now(timezone.utc)) - started_at).total_seconds()
+        runtime_str = _fmt_hms(runtime_seconds, runtime_str)
+        
+        if processed > 0 and runtime_seconds > 0:
+            speed = processed / runtime_seconds * 60  # messages per minute
+            speed_str = f"{speed:.1f} 条/分钟"
+            
+            # 预计剩余时间
+            remaining_count = total - processed
+            if speed > 0:
+                remaining_str = _fmt_hms(remaining_count / speed * 60, remaining_str)
+    
+    return _PROGRESS_TEMPLATE.format_map({
+        'processed': processed,
+        'total': total,
+        'progress_percent': progress_percent,
+        'progress_bar': _PROGRESS_BARS[min(20, int(progress_percent / 5))],
+        'runtime_str': runtime_str,
+        'remaining_str': remaining_str,
+        'speed_str': speed_str,
+        'account_section': account_section,
+        'sent': sent,
+        'failed': failed,
+        'pending': total - processed,
+        'logs_section': logs_section
+    })
+
+
+def _progress_keyboard(task_id):
+    """Inline keyboard shown under the progress message"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("🔄 刷新进度", callback_data=f'task_progress_refresh_{task_id}')],
+        [InlineKeyboardButton("⏹️ 停止任务", callback_data=f'task_stop_{task_id}')]
+    ])
+
+
 # ============================================================================
 # 编辑模式和回复模式类
 # ============================================================================
@@ -1528,7 +1738,8 @@ class AccountManager:
             session_name=session_name,
             api_id=Config.API_ID,
             api_hash=Config.API_HASH,
-            status=AccountStatus.ACTIVE.value
+            status=AccountStatus.ACTIVE.value,
+            session_format='session'  # 手机号登录只生成 Telethon .session
         )
         result = self.accounts_col.insert_one(account.to_dict())
         account._id = result.inserted_id
@@ -1598,6 +1809,16 @@ class AccountManager:
             shutil.copy2(session_path, new_path)
             logger.info(f"Session file copied to: {new_path}")
             
+            # 同名 json（xxx.json 或 xxx.session.json）随 session 一起导入，
+            # 存为 <session>.json，与导出/删除逻辑使用的路径一致
+            session_format = 'session'
+            for json_path in (f"{session_path}.json", f"{os.path.splitext(session_path)[0]}.json"):
+                if os.path.exists(json_path):
+                    shutil.copy2(json_path, f"{new_path}.json")
+                    session_format = 'session+json'
+                    logger.info(f"Json file copied to: {new_path}.json")
+                    break
+            
             # 确保状态设置为 ACTIVE
             account = Account(
                 phone=phone,
@@ -1605,7 +1826,8 @@ class AccountManager:
                 api_id=str(api_id),
                 api_hash=api_hash,
                 status=AccountStatus.ACTIVE.value,  # 明确设置为 ACTIVE
-                account_type=account_type  # 设置账户类型
+                account_type=account_type,  # 设置账户类型
+                session_format=session_format
             )
             result = self.accounts_col.insert_one(account.to_dict())
             account._id = result.inserted_id
@@ -1940,6 +2162,7 @@ class TaskManager:
         self.bot_application = bot_application  # 用于发送完成报告
         self._account_check_cache = {}  # Cache for check_and_stop_if_no_accounts {task_id: {'result': bool, 'checked_at': datetime}}
         self.recent_logs = {}  # {task_id: [{'time': datetime, 'target': str, 'status': str, 'message': str, 'account': str}, ...]}
+        self.recent_log_seq = {}  # {task_id: int} - bumped on every recent log append, used for cheap change detection
         self.stop_events = {}  # {task_id: asyncio.Event} - for reply monitoring
         self.current_account_info = {}  # {task_id: {'phone': str, 'sent_today': int, 'daily_limit': int}}
     
@@ -4038,6 +4261,7 @@ class TaskManager:
         
         # Add new entry
         self.recent_logs[task_id].append(log_entry)
+        self.recent_log_seq[task_id] = self.recent_log_seq.get(task_id, 0) + 1
         
         # Keep only last 20 entries
         if len(self.recent_logs[task_id]) > 20:
@@ -4055,6 +4279,10 @@ class TaskManager:
         # Return last N entries
         return self.recent_logs[task_id][-limit:] if limit else self.recent_logs[task_id]
     
+    def _get_recent_log_seq(self, task_id):
+        """Get the recent log sequence number for task (changes whenever a log is added)"""
+        return self.recent_log_seq.get(task_id, 0)
+    
     def _update_current_account(self, task_id, account):
         """Update current account information for task"""
         task_id_str = str(task_id)
@@ -4236,6 +4464,23 @@ class TaskManager:
  CONFIG_VOICE_CALL_INPUT, CONFIG_DAILY_LIMIT_INPUT, CONFIG_RETRY_INPUT,
  CONFIG_THREAD_INTERVAL_INPUT, CONFIG_BATCH_COUNT_INPUT, CONFIG_BATCH_DELAY_INPUT) = range(27)
 
+# user_data keys owned by the task configuration conversation
+_CONFIG_KEYS = ('config_task_id', 'retry_count', 'current_config_type', 'config_prompt_msg_id')
+
+
+def _clear_config_user_data(user_data):
+    """Drop only the config conversation's keys, leaving other conversations' state intact"""
+    for key in _CONFIG_KEYS:
+        user_data.pop(key, None)
+
+
+def _main_menu_keyboard():
+    """主菜单按钮；采集功能关闭（ENABLE_COLLECTION=0）时不显示采集入口"""
+    first_row = [InlineKeyboardButton("📢 广告私信", callback_data='menu_messaging')]
+    if Config.ENABLE_COLLECTION:
+        first_row.append(InlineKeyboardButton("👥 采集用户", callback_data='menu_collection'))
+    return [first_row, [InlineKeyboardButton("❓ 帮助", callback_data='menu_help')]]
+
 # Global managers
 account_manager = None
 task_manager = None
@@ -4263,11 +4508,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     total_tasks = db[Task.COLLECTION_NAME].count_documents({})
     running_tasks = db[Task.COLLECTION_NAME].count_documents({'status': TaskStatus.RUNNING.value})
     
-    keyboard = [
-        [InlineKeyboardButton("📢 广告私信", callback_data='menu_messaging'), InlineKeyboardButton("👥 采集用户", callback_data='menu_collection')],
-        [InlineKeyboardButton("❓ 帮助", callback_data='menu_help')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = InlineKeyboardMarkup(_main_menu_keyboard())
     
     # Enhanced welcome message with stats
     text = (
@@ -4289,6 +4530,31 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='HTML')
 
 
+async def _reply_collection_export(query, export, collection_id, filename, unit, empty_text):
+    """将采集结果逐行导出到临时 CSV 文件并发送，发送后删除
+
+    每次导出使用独立的临时文件，同一任务的并发导出互不覆盖。
+    """
+    if not ObjectId.is_valid(collection_id):
+        await query.message.reply_text("❌ 无效的采集任务 ID")
+        return
+    fd, path = tempfile.mkstemp(prefix='collected_', suffix='.csv', dir=Config.RESULTS_DIR)
+    try:
+        with open(fd, 'w', encoding='utf-8', newline='') as f:
+            count = await export(collection_id, f)
+        if count:
+            with open(path, 'rb') as f:
+                await query.message.reply_document(
+                    document=f,
+                    filename=filename,
+                    caption=f"✅ 已导出 {count} {unit}"
+                )
+        else:
+            await query.message.reply_text(empty_text)
+    finally:
+        os.remove(path)
+
+
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle button callbacks"""
     query = update.callback_query
@@ -4298,6 +4564,10 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     logger.info(f"Button clicked by user {username} ({user_id}): {data}")
     
+    if not Config.ENABLE_COLLECTION and data.startswith(('menu_collection', 'collection_')):
+        await safe_answer_query(query, "⚠️ 采集功能未启用", show_alert=True)
+        return
+    
     # Immediately answer query to prevent timeout (with error handling)
     # The actual handlers will update the message content
     async def answer_query_with_logging():
@@ -4511,8 +4781,14 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.info(f"User {user_id} viewing collection list")
         await caiji.show_collection_list(query)
     elif data.startswith('collection_list_'):
-        page = int(data.split('_')[2])
-        await caiji.show_collection_list(query, page)
+        # collection_list_{n|p}_{page}_{created_at毫秒}_{_id}
+        parts = data.split('_')
+        if (len(parts) == 6 and parts[2] in ('n', 'p') and parts[3].isdecimal()
+                and parts[4].isdecimal() and ObjectId.is_valid(parts[5])):
+            await caiji.show_collection_list(query, int(parts[3]), parts[2], int(parts[4]), parts[5])
+        else:
+            # 旧版按页码分页的按钮或格式错误的数据，回到首页
+            await caiji.show_collection_list(query)
     elif data.startswith('collection_detail_'):
         collection_id = data.split('_')[2]
         await caiji.show_collection_detail(query, collection_id)
@@ -4538,7 +4814,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         collection_id = data.split('_')[2]
         await safe_answer_query(query, "🗑️ 正在删除采集任务...", show_alert=False)
         try:
-            collection_manager.delete_collection(collection_id)
+            await collection_manager.delete_collection(collection_id)
             await query.message.reply_text("✅ 采集任务已删除")
             await caiji.show_collection_list(query)
         except Exception as e:
@@ -4547,50 +4823,20 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         collection_id = data.split('_')[3]
         await safe_answer_query(query, "📥 正在导出用户列表...", show_alert=False)
         try:
-            users = await collection_manager.export_collected_users(collection_id)
-            if users:
-                # Create CSV content
-                output = io.StringIO()
-                writer = csv.DictWriter(output, fieldnames=['user_id', 'username', 'first_name', 'last_name', 'tags'])
-                writer.writeheader()
-                writer.writerows(users)
-                
-                # Send as file
-                file_content = output.getvalue().encode('utf-8')
-                file_bytes = io.BytesIO(file_content)
-                file_bytes.name = f'collected_users_{collection_id}.csv'
-                await query.message.reply_document(
-                    document=file_bytes,
-                    filename=f'collected_users_{collection_id}.csv',
-                    caption=f"✅ 已导出 {len(users)} 个用户"
-                )
-            else:
-                await query.message.reply_text("❌ 没有用户数据")
+            await _reply_collection_export(
+                query, collection_manager.export_collected_users, collection_id,
+                f'collected_users_{collection_id}.csv', "个用户", "❌ 没有用户数据"
+            )
         except Exception as e:
             await query.message.reply_text(f"❌ 导出失败: {str(e)}")
     elif data.startswith('collection_export_groups_'):
         collection_id = data.split('_')[3]
         await safe_answer_query(query, "📥 正在导出群组列表...", show_alert=False)
         try:
-            groups = await collection_manager.export_collected_groups(collection_id)
-            if groups:
-                # Create CSV content
-                output = io.StringIO()
-                writer = csv.DictWriter(output, fieldnames=['group_id', 'title', 'username', 'link', 'member_count', 'is_public'])
-                writer.writeheader()
-                writer.writerows(groups)
-                
-                # Send as file
-                file_content = output.getvalue().encode('utf-8')
-                file_bytes = io.BytesIO(file_content)
-                file_bytes.name = f'collected_groups_{collection_id}.csv'
-                await query.message.reply_document(
-                    document=file_bytes,
-                    filename=f'collected_groups_{collection_id}.csv',
-                    caption=f"✅ 已导出 {len(groups)} 个群组/频道"
-                )
-            else:
-                await query.message.reply_text("❌ 没有群组数据")
+            await _reply_collection_export(
+                query, collection_manager.export_collected_groups, collection_id,
+                f'collected_groups_{collection_id}.csv', "个群组/频道", "❌ 没有群组数据"
+            )
         except Exception as e:
             await query.message.reply_text(f"❌ 导出失败: {str(e)}")
     
@@ -5804,9 +6050,7 @@ async def show_task_detail(query, task_id):
         })
         
         # Enhanced running task display
-        progress_bar_length = 20
-        filled = int(progress / 5)  # 5% per bar
-        progress_bar = '█' * filled + '░' * (progress_bar_length - filled)
+        progress_bar = _PROGRESS_BARS[min(20, int(progress / 5))]  # 5% per bar
         
         text = (
             f"🚀 <b>正在私信中</b>\n\n"
@@ -5932,9 +6176,13 @@ async def show_task_detail(query, task_id):
     await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
 
 
-async def show_task_config(query, task_id):
-    """Show task configuration options"""
-    task_doc = db[Task.COLLECTION_NAME].find_one({'_id': ObjectId(task_id)})
+async def show_task_config(query, task_id, task_doc=None):
+    """Show task configuration options
+    
+    ``task_doc`` may be passed by callers that already hold the latest document.
+    """
+    if task_doc is None:
+        task_doc = db[Task.COLLECTION_NAME].find_one({'_id': ObjectId(task_id)})
     if not task_doc:
         await safe_answer_query(query, "❌ 任务不存在", show_alert=True)
         return
@@ -6459,18 +6707,12 @@ async def handle_thread_config(update: Update, context: ContextTypes.DEFAULT_TYP
                     "已自动取消配置，请重新开始",
                     parse_mode='HTML'
                 )
-                await asyncio.sleep(2)
-                try:
-                    await msg.delete()
-                    await update.message.delete()
-                    if 'config_prompt_msg_id' in context.user_data:
-                        await context.bot.delete_message(
-                            chat_id=update.effective_chat.id,
-                            message_id=context.user_data['config_prompt_msg_id']
-                        )
-                except Exception:
-                    pass
-                context.user_data.clear()
+                _schedule_delayed_cleanup(
+                    context.bot,
+                    update.effective_chat.id,
+                    [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')]
+                )
+                _clear_config_user_data(context.user_data)
                 return ConversationHandler.END
             
             await update.message.reply_text(
@@ -6488,23 +6730,13 @@ async def handle_thread_config(update: Update, context: ContextTypes.DEFAULT_TYP
         
         msg = await update.message.reply_text(f"✅ 线程数已设置为：{thread_count}")
         # Auto-delete after configured delay
-        await asyncio.sleep(Config.CONFIG_MESSAGE_DELETE_DELAY)
-        try:
-            # Delete confirmation message
-            await msg.delete()
-            # Delete user input message
-            await update.message.delete()
-            # Delete prompt message
-            prompt_msg_id = context.user_data.get('config_prompt_msg_id')
-            if prompt_msg_id:
-                await context.bot.delete_message(
-                    chat_id=update.effective_chat.id,
-                    message_id=prompt_msg_id
-                )
-        except Exception as e:
-            logger.warning(f"Failed to delete config message: {e}")
-        
-        context.user_data.clear()
+        _schedule_delayed_cleanup(
+            context.bot,
+            update.effective_chat.id,
+            [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')],
+            delay=Config.CONFIG_MESSAGE_DELETE_DELAY
+        )
+        _clear_config_user_data(context.user_data)
         return ConversationHandler.END
         
     except ValueError:
@@ -6518,18 +6750,12 @@ async def handle_thread_config(update: Update, context: ContextTypes.DEFAULT_TYP
                 "已自动取消配置，请重新开始",
                 parse_mode='HTML'
             )
-            await asyncio.sleep(2)
-            try:
-                await msg.delete()
-                await update.message.delete()
-                if 'config_prompt_msg_id' in context.user_data:
-                    await context.bot.delete_message(
-                        chat_id=update.effective_chat.id,
-                        message_id=context.user_data['config_prompt_msg_id']
-                    )
-            except Exception:
-                pass
-            context.user_data.clear()
+            _schedule_delayed_cleanup(
+                context.bot,
+                update.effective_chat.id,
+                [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')]
+            )
+            _clear_config_user_data(context.user_data)
             return ConversationHandler.END
         
         await update.message.reply_text(
@@ -6560,18 +6786,12 @@ async def handle_interval_config(update: Update, context: ContextTypes.DEFAULT_T
                     "已自动取消配置，请重新开始",
                     parse_mode='HTML'
                 )
-                await asyncio.sleep(2)
-                try:
-                    await msg.delete()
-                    await update.message.delete()
-                    if 'config_prompt_msg_id' in context.user_data:
-                        await context.bot.delete_message(
-                            chat_id=update.effective_chat.id,
-                            message_id=context.user_data['config_prompt_msg_id']
-                        )
-                except Exception:
-                    pass
-                context.user_data.clear()
+                _schedule_delayed_cleanup(
+                    context.bot,
+                    update.effective_chat.id,
+                    [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')]
+                )
+                _clear_config_user_data(context.user_data)
                 return ConversationHandler.END
             
             await update.message.reply_text(
@@ -6595,18 +6815,12 @@ async def handle_interval_config(update: Update, context: ContextTypes.DEFAULT_T
                     "已自动取消配置，请重新开始",
                     parse_mode='HTML'
                 )
-                await asyncio.sleep(2)
-                try:
-                    await msg.delete()
-                    await update.message.delete()
-                    if 'config_prompt_msg_id' in context.user_data:
-                        await context.bot.delete_message(
-                            chat_id=update.effective_chat.id,
-                            message_id=context.user_data['config_prompt_msg_id']
-                        )
-                except Exception:
-                    pass
-                context.user_data.clear()
+                _schedule_delayed_cleanup(
+                    context.bot,
+                    update.effective_chat.id,
+                    [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')]
+                )
+                _clear_config_user_data(context.user_data)
                 return ConversationHandler.END
             
             await update.message.reply_text(
@@ -6628,23 +6842,13 @@ async def handle_interval_config(update: Update, context: ContextTypes.DEFAULT_T
         
         msg = await update.message.reply_text(f"✅ 发送间隔已设置为：{min_interval}-{max_interval} 秒")
         # Auto-delete after configured delay
-        await asyncio.sleep(Config.CONFIG_MESSAGE_DELETE_DELAY)
-        try:
-            # Delete confirmation message
-            await msg.delete()
-            # Delete user input message
-            await update.message.delete()
-            # Delete prompt message
-            prompt_msg_id = context.user_data.get('config_prompt_msg_id')
-            if prompt_msg_id:
-                await context.bot.delete_message(
-                    chat_id=update.effective_chat.id,
-                    message_id=prompt_msg_id
-                )
-        except Exception as e:
-            logger.warning(f"Failed to delete config message: {e}")
-        
-        context.user_data.clear()
+        _schedule_delayed_cleanup(
+            context.bot,
+            update.effective_chat.id,
+            [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')],
+            delay=Config.CONFIG_MESSAGE_DELETE_DELAY
+        )
+        _clear_config_user_data(context.user_data)
         return ConversationHandler.END
         
     except ValueError:
@@ -6657,18 +6861,12 @@ async def handle_interval_config(update: Update, context: ContextTypes.DEFAULT_T
                 "已自动取消配置，请重新开始",
                 parse_mode='HTML'
             )
-            await asyncio.sleep(2)
-            try:
-                await msg.delete()
-                await update.message.delete()
-                if 'config_prompt_msg_id' in context.user_data:
-                    await context.bot.delete_message(
-                        chat_id=update.effective_chat.id,
-                        message_id=context.user_data['config_prompt_msg_id']
-                    )
-            except Exception:
-                pass
-            context.user_data.clear()
+            _schedule_delayed_cleanup(
+                context.bot,
+                update.effective_chat.id,
+                [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')]
+            )
+            _clear_config_user_data(context.user_data)
             return ConversationHandler.END
         
         await update.message.reply_text(
@@ -6699,18 +6897,12 @@ async def handle_bidirect_config(update: Update, context: ContextTypes.DEFAULT_T
                     "已自动取消配置，请重新开始",
                     parse_mode='HTML'
                 )
-                await asyncio.sleep(2)
-                try:
-                    await msg.delete()
-                    await update.message.delete()
-                    if 'config_prompt_msg_id' in context.user_data:
-                        await context.bot.delete_message(
-                            chat_id=update.effective_chat.id,
-                            message_id=context.user_data['config_prompt_msg_id']
-                        )
-                except Exception:
-                    pass
-                context.user_data.clear()
+                _schedule_delayed_cleanup(
+                    context.bot,
+                    update.effective_chat.id,
+                    [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')]
+                )
+                _clear_config_user_data(context.user_data)
                 return ConversationHandler.END
             
             await update.message.reply_text(
@@ -6728,23 +6920,13 @@ async def handle_bidirect_config(update: Update, context: ContextTypes.DEFAULT_T
         
         msg = await update.message.reply_text(f"✅ 无视双向次数已设置为：{limit}")
         # Auto-delete after configured delay
-        await asyncio.sleep(Config.CONFIG_MESSAGE_DELETE_DELAY)
-        try:
-            # Delete confirmation message
-            await msg.delete()
-            # Delete user input message
-            await update.message.delete()
-            # Delete prompt message
-            prompt_msg_id = context.user_data.get('config_prompt_msg_id')
-            if prompt_msg_id:
-                await context.bot.delete_message(
-                    chat_id=update.effective_chat.id,
-                    message_id=prompt_msg_id
-                )
-        except Exception as e:
-            logger.warning(f"Failed to delete config message: {e}")
-        
-        context.user_data.clear()
+        _schedule_delayed_cleanup(
+            context.bot,
+            update.effective_chat.id,
+            [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')],
+            delay=Config.CONFIG_MESSAGE_DELETE_DELAY
+        )
+        _clear_config_user_data(context.user_data)
         return ConversationHandler.END
         
     except ValueError:
@@ -6757,18 +6939,12 @@ async def handle_bidirect_config(update: Update, context: ContextTypes.DEFAULT_T
                 "已自动取消配置，请重新开始",
                 parse_mode='HTML'
             )
-            await asyncio.sleep(2)
-            try:
-                await msg.delete()
-                await update.message.delete()
-                if 'config_prompt_msg_id' in context.user_data:
-                    await context.bot.delete_message(
-                        chat_id=update.effective_chat.id,
-                        message_id=context.user_data['config_prompt_msg_id']
-                    )
-            except Exception:
-                pass
-            context.user_data.clear()
+            _schedule_delayed_cleanup(
+                context.bot,
+                update.effective_chat.id,
+                [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')]
+            )
+            _clear_config_user_data(context.user_data)
             return ConversationHandler.END
         
         await update.message.reply_text(
@@ -6778,28 +6954,6 @@ async def handle_bidirect_config(update: Update, context: ContextTypes.DEFAULT_T
             parse_mode='HTML'
         )
         return CONFIG_BIDIRECT_INPUT
-        await asyncio.sleep(Config.CONFIG_MESSAGE_DELETE_DELAY)
-        try:
-            # Delete confirmation message
-            await msg.delete()
-            # Delete user input message
-            await update.message.delete()
-            # Delete prompt message
-            prompt_msg_id = context.user_data.get('config_prompt_msg_id')
-            if prompt_msg_id:
-                await context.bot.delete_message(
-                    chat_id=update.effective_chat.id,
-                    message_id=prompt_msg_id
-                )
-        except Exception as e:
-            logger.warning(f"Failed to delete config message: {e}")
-        
-        context.user_data.clear()
-        return ConversationHandler.END
-        
-    except ValueError:
-        await update.message.reply_text("❌ 请输入有效的数字：")
-        return CONFIG_BIDIRECT_INPUT
 
 
 # ============================================================================
@@ -6946,18 +7100,13 @@ async def handle_reply_mode_config(update: Update, context: ContextTypes.DEFAULT
         msg = await update.message.reply_text("✅ 回复模式配置已清空")
         
         # Auto-cleanup
-        await asyncio.sleep(Config.CONFIG_MESSAGE_DELETE_DELAY)
-        try:
-            await update.message.delete()
-            await msg.delete()
-            if 'config_prompt_msg_id' in context.user_data:
-                await context.bot.delete_message(
-                    chat_id=update.effective_chat.id,
-                    message_id=context.user_data['config_prompt_msg_id']
-                )
-        except Exception as e:
-            logger.debug(f"Failed to delete config messages: {e}")
-        
+        _schedule_delayed_cleanup(
+            context.bot,
+            update.effective_chat.id,
+            [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')],
+            delay=Config.CONFIG_MESSAGE_DELETE_DELAY
+        )
+        _clear_config_user_data(context.user_data)
         return ConversationHandler.END
     
     try:
@@ -7026,18 +7175,13 @@ async def handle_reply_mode_config(update: Update, context: ContextTypes.DEFAULT
         msg = await update.message.reply_text(success_msg)
         
         # Auto-cleanup
-        await asyncio.sleep(Config.CONFIG_MESSAGE_DELETE_DELAY)
-        try:
-            await update.message.delete()
-            await msg.delete()
-            if 'config_prompt_msg_id' in context.user_data:
-                await context.bot.delete_message(
-                    chat_id=update.effective_chat.id,
-                    message_id=context.user_data['config_prompt_msg_id']
-                )
-        except Exception as e:
-            logger.debug(f"Failed to delete config messages: {e}")
-        
+        _schedule_delayed_cleanup(
+            context.bot,
+            update.effective_chat.id,
+            [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')],
+            delay=Config.CONFIG_MESSAGE_DELETE_DELAY
+        )
+        _clear_config_user_data(context.user_data)
         return ConversationHandler.END
         
     except Exception as e:
@@ -7151,18 +7295,13 @@ async def handle_batch_count_config(update: Update, context: ContextTypes.DEFAUL
         msg = await update.message.reply_text(f"✅ 批次停顿条数已设置为: {batch_count}")
         
         # Auto-cleanup
-        await asyncio.sleep(Config.CONFIG_MESSAGE_DELETE_DELAY)
-        try:
-            await update.message.delete()
-            await msg.delete()
-            if 'config_prompt_msg_id' in context.user_data:
-                await context.bot.delete_message(
-                    chat_id=update.effective_chat.id,
-                    message_id=context.user_data['config_prompt_msg_id']
-                )
-        except Exception as e:
-            logger.debug(f"Failed to delete config messages: {e}")
-        
+        _schedule_delayed_cleanup(
+            context.bot,
+            update.effective_chat.id,
+            [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')],
+            delay=Config.CONFIG_MESSAGE_DELETE_DELAY
+        )
+        _clear_config_user_data(context.user_data)
         return ConversationHandler.END
         
     except ValueError:
@@ -7251,18 +7390,13 @@ async def handle_batch_delay_config(update: Update, context: ContextTypes.DEFAUL
         msg = await update.message.reply_text(f"✅ 批次停顿时长已设置为: {min_delay}-{max_delay} 秒")
         
         # Auto-cleanup
-        await asyncio.sleep(Config.CONFIG_MESSAGE_DELETE_DELAY)
-        try:
-            await update.message.delete()
-            await msg.delete()
-            if 'config_prompt_msg_id' in context.user_data:
-                await context.bot.delete_message(
-                    chat_id=update.effective_chat.id,
-                    message_id=context.user_data['config_prompt_msg_id']
-                )
-        except Exception as e:
-            logger.debug(f"Failed to delete config messages: {e}")
-        
+        _schedule_delayed_cleanup(
+            context.bot,
+            update.effective_chat.id,
+            [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')],
+            delay=Config.CONFIG_MESSAGE_DELETE_DELAY
+        )
+        _clear_config_user_data(context.user_data)
         return ConversationHandler.END
         
     except ValueError:
@@ -7466,6 +7600,28 @@ async def toggle_voice_call(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return await request_voice_call_config(update, context)
 
 
+def _toggle_task_flag(task_id, field, default=False):
+    """
+    原子地翻转任务的布尔配置字段（单次数据库往返）
+    
+    Args:
+        task_id: 任务 ID
+        field: 要翻转的字段名
+        default: 字段不存在时视为的当前值
+        
+    Returns:
+        dict: 更新后的任务文档，任务不存在时返回 None
+    """
+    return db[Task.COLLECTION_NAME].find_one_and_update(
+        {'_id': ObjectId(task_id)},
+        [{'$set': {
+            field: {'$not': [{'$ifNull': [f'${field}', default]}]},
+            'updated_at': '$$NOW'
+        }}],
+        return_document=ReturnDocument.AFTER
+    )
+
+
 async def toggle_dead_account_switch(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Toggle auto switch dead account"""
     query = update.callback_query
@@ -7474,21 +7630,16 @@ async def toggle_dead_account_switch(update: Update, context: ContextTypes.DEFAU
     # Extract task_id from the last part
     task_id = query.data.split('_')[-1]
     
-    task_doc = db[Task.COLLECTION_NAME].find_one({'_id': ObjectId(task_id)})
-    task = Task.from_dict(task_doc)
-    
-    new_value = not getattr(task, 'auto_switch_dead_account', True)
-    
-    result = db[Task.COLLECTION_NAME].update_one(
-        {'_id': ObjectId(task_id)},
-        {'$set': {'auto_switch_dead_account': new_value, 'updated_at': datetime.utcnow()}}
-    )
+    task_doc = _toggle_task_flag(task_id, 'auto_switch_dead_account', default=True)
+    if not task_doc:
+        await safe_answer_query(query, "❌ 任务不存在", show_alert=True)
+        return
     
-    if result.modified_count > 0:
-        logger.info(f"Task {task_id}: Auto switch dead account {'enabled' if new_value else 'disabled'}")
+    new_value = task_doc['auto_switch_dead_account']
+    logger.info(f"Task {task_id}: Auto switch dead account {'enabled' if new_value else 'disabled'}")
     
     await safe_answer_query(query, f"✅ 死号自动换号已{'启用' if new_value else '禁用'}")
-    return await show_config_menu_handler(update, context, task_id)
+    return await show_config_menu_handler(update, context, task_id, task_doc=task_doc)
 
 
 async def request_thread_interval_config(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -7572,18 +7723,12 @@ async def handle_daily_limit_config(update: Update, context: ContextTypes.DEFAUL
                     "已自动取消配置，请重新开始",
                     parse_mode='HTML'
                 )
-                await asyncio.sleep(2)
-                try:
-                    await msg.delete()
-                    await update.message.delete()
-                    if 'config_prompt_msg_id' in context.user_data:
-                        await context.bot.delete_message(
-                            chat_id=update.effective_chat.id,
-                            message_id=context.user_data['config_prompt_msg_id']
-                        )
-                except Exception:
-                    pass
-                context.user_data.clear()
+                _schedule_delayed_cleanup(
+                    context.bot,
+                    update.effective_chat.id,
+                    [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')]
+                )
+                _clear_config_user_data(context.user_data)
                 return ConversationHandler.END
             
             await update.message.reply_text(
@@ -7608,18 +7753,13 @@ async def handle_daily_limit_config(update: Update, context: ContextTypes.DEFAUL
             msg = await update.message.reply_text(f"✅ 单账号日限已设置为：{daily_limit}条（值未变更）")
         
         # Auto-cleanup
-        await asyncio.sleep(Config.CONFIG_MESSAGE_DELETE_DELAY)
-        try:
-            await update.message.delete()
-            await msg.delete()
-            if 'config_prompt_msg_id' in context.user_data:
-                await context.bot.delete_message(
-                    chat_id=update.effective_chat.id,
-                    message_id=context.user_data['config_prompt_msg_id']
-                )
-        except Exception as e:
-            logger.debug(f"Failed to delete config messages: {e}")
-        
+        _schedule_delayed_cleanup(
+            context.bot,
+            update.effective_chat.id,
+            [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')],
+            delay=Config.CONFIG_MESSAGE_DELETE_DELAY
+        )
+        _clear_config_user_data(context.user_data)
         return ConversationHandler.END
         
     except ValueError:
@@ -7632,18 +7772,12 @@ async def handle_daily_limit_config(update: Update, context: ContextTypes.DEFAUL
                 "已自动取消配置，请重新开始",
                 parse_mode='HTML'
             )
-            await asyncio.sleep(2)
-            try:
-                await msg.delete()
-                await update.message.delete()
-                if 'config_prompt_msg_id' in context.user_data:
-                    await context.bot.delete_message(
-                        chat_id=update.effective_chat.id,
-                        message_id=context.user_data['config_prompt_msg_id']
-                    )
-            except Exception:
-                pass
-            context.user_data.clear()
+            _schedule_delayed_cleanup(
+                context.bot,
+                update.effective_chat.id,
+                [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')]
+            )
+            _clear_config_user_data(context.user_data)
             return ConversationHandler.END
         
         await update.message.reply_text(
@@ -7710,18 +7844,12 @@ async def handle_retry_config(update: Update, context: ContextTypes.DEFAULT_TYPE
                     "已自动取消配置，请重新开始",
                     parse_mode='HTML'
                 )
-                await asyncio.sleep(2)
-                try:
-                    await msg.delete()
-                    await update.message.delete()
-                    if 'config_prompt_msg_id' in context.user_data:
-                        await context.bot.delete_message(
-                            chat_id=update.effective_chat.id,
-                            message_id=context.user_data['config_prompt_msg_id']
-                        )
-                except Exception:
-                    pass
-                context.user_data.clear()
+                _schedule_delayed_cleanup(
+                    context.bot,
+                    update.effective_chat.id,
+                    [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')]
+                )
+                _clear_config_user_data(context.user_data)
                 return ConversationHandler.END
             
             await update.message.reply_text(
@@ -7745,18 +7873,12 @@ async def handle_retry_config(update: Update, context: ContextTypes.DEFAULT_TYPE
                     "已自动取消配置，请重新开始",
                     parse_mode='HTML'
                 )
-                await asyncio.sleep(2)
-                try:
-                    await msg.delete()
-                    await update.message.delete()
-                    if 'config_prompt_msg_id' in context.user_data:
-                        await context.bot.delete_message(
-                            chat_id=update.effective_chat.id,
-                            message_id=context.user_data['config_prompt_msg_id']
-                        )
-                except Exception:
-                    pass
-                context.user_data.clear()
+                _schedule_delayed_cleanup(
+                    context.bot,
+                    update.effective_chat.id,
+                    [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')]
+                )
+                _clear_config_user_data(context.user_data)
                 return ConversationHandler.END
             
             await update.message.reply_text(
@@ -7777,18 +7899,12 @@ async def handle_retry_config(update: Update, context: ContextTypes.DEFAULT_TYPE
                     "已自动取消配置，请重新开始",
                     parse_mode='HTML'
                 )
-                await asyncio.sleep(2)
-                try:
-                    await msg.delete()
-                    await update.message.delete()
-                    if 'config_prompt_msg_id' in context.user_data:
-                        await context.bot.delete_message(
-                            chat_id=update.effective_chat.id,
-                            message_id=context.user_data['config_prompt_msg_id']
-                        )
-                except Exception:
-                    pass
-                context.user_data.clear()
+                _schedule_delayed_cleanup(
+                    context.bot,
+                    update.effective_chat.id,
+                    [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')]
+                )
+                _clear_config_user_data(context.user_data)
                 return ConversationHandler.END
             
             await update.message.reply_text(
@@ -7821,18 +7937,13 @@ async def handle_retry_config(update: Update, context: ContextTypes.DEFAULT_TYPE
             )
         
         # Auto-cleanup
-        await asyncio.sleep(Config.CONFIG_MESSAGE_DELETE_DELAY)
-        try:
-            await update.message.delete()
-            await msg.delete()
-            if 'config_prompt_msg_id' in context.user_data:
-                await context.bot.delete_message(
-                    chat_id=update.effective_chat.id,
-                    message_id=context.user_data['config_prompt_msg_id']
-                )
-        except Exception as e:
-            logger.debug(f"Failed to delete config messages: {e}")
-        
+        _schedule_delayed_cleanup(
+            context.bot,
+            update.effective_chat.id,
+            [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')],
+            delay=Config.CONFIG_MESSAGE_DELETE_DELAY
+        )
+        _clear_config_user_data(context.user_data)
         return ConversationHandler.END
         
     except ValueError:
@@ -7845,18 +7956,12 @@ async def handle_retry_config(update: Update, context: ContextTypes.DEFAULT_TYPE
                 "已自动取消配置，请重新开始",
                 parse_mode='HTML'
             )
-            await asyncio.sleep(2)
-            try:
-                await msg.delete()
-                await update.message.delete()
-                if 'config_prompt_msg_id' in context.user_data:
-                    await context.bot.delete_message(
-                        chat_id=update.effective_chat.id,
-                        message_id=context.user_data['config_prompt_msg_id']
-                    )
-            except Exception:
-                pass
-            context.user_data.clear()
+            _schedule_delayed_cleanup(
+                context.bot,
+                update.effective_chat.id,
+                [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')]
+            )
+            _clear_config_user_data(context.user_data)
             return ConversationHandler.END
         
         await update.message.reply_text(
@@ -7876,21 +7981,16 @@ async def toggle_force_private_mode(update: Update, context: ContextTypes.DEFAUL
     # Extract task_id from the last part
     task_id = query.data.split('_')[-1]
     
-    task_doc = db[Task.COLLECTION_NAME].find_one({'_id': ObjectId(task_id)})
-    task = Task.from_dict(task_doc)
-    
-    new_value = not getattr(task, 'force_private_mode', False)
-    
-    result = db[Task.COLLECTION_NAME].update_one(
-        {'_id': ObjectId(task_id)},
-        {'$set': {'force_private_mode': new_value, 'updated_at': datetime.utcnow()}}
-    )
+    task_doc = _toggle_task_flag(task_id, 'force_private_mode', default=False)
+    if not task_doc:
+        await safe_answer_query(query, "❌ 任务不存在", show_alert=True)
+        return
     
-    if result.modified_count > 0:
-        logger.info(f"Task {task_id}: Force private mode {'enabled' if new_value else 'disabled'}")
+    new_value = task_doc['force_private_mode']
+    logger.info(f"Task {task_id}: Force private mode {'enabled' if new_value else 'disabled'}")
     
     await safe_answer_query(query, f"✅ 强制私信模式已{'启用' if new_value else '禁用'}")
-    return await show_config_menu_handler(update, context, task_id)
+    return await show_config_menu_handler(update, context, task_id, task_doc=task_doc)
 
 
 async def handle_thread_interval_config(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -7913,18 +8013,12 @@ async def handle_thread_interval_config(update: Update, context: ContextTypes.DE
                     "已自动取消配置，请重新开始",
                     parse_mode='HTML'
                 )
-                await asyncio.sleep(2)
-                try:
-                    await msg.delete()
-                    await update.message.delete()
-                    if 'config_prompt_msg_id' in context.user_data:
-                        await context.bot.delete_message(
-                            chat_id=update.effective_chat.id,
-                            message_id=context.user_data['config_prompt_msg_id']
-                        )
-                except Exception:
-                    pass
-                context.user_data.clear()
+                _schedule_delayed_cleanup(
+                    context.bot,
+                    update.effective_chat.id,
+                    [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')]
+                )
+                _clear_config_user_data(context.user_data)
                 return ConversationHandler.END
             
             await update.message.reply_text(
@@ -7949,18 +8043,13 @@ async def handle_thread_interval_config(update: Update, context: ContextTypes.DE
             msg = await update.message.reply_text(f"✅ 线程启动间隔已设置为：{interval}秒（值未变更）")
         
         # Auto-cleanup
-        await asyncio.sleep(Config.CONFIG_MESSAGE_DELETE_DELAY)
-        try:
-            await update.message.delete()
-            await msg.delete()
-            if 'config_prompt_msg_id' in context.user_data:
-                await context.bot.delete_message(
-                    chat_id=update.effective_chat.id,
-                    message_id=context.user_data['config_prompt_msg_id']
-                )
-        except Exception as e:
-            logger.debug(f"Failed to delete config messages: {e}")
-        
+        _schedule_delayed_cleanup(
+            context.bot,
+            update.effective_chat.id,
+            [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')],
+            delay=Config.CONFIG_MESSAGE_DELETE_DELAY
+        )
+        _clear_config_user_data(context.user_data)
         return ConversationHandler.END
         
     except ValueError:
@@ -7973,18 +8062,12 @@ async def handle_thread_interval_config(update: Update, context: ContextTypes.DE
                 "已自动取消配置，请重新开始",
                 parse_mode='HTML'
             )
-            await asyncio.sleep(2)
-            try:
-                await msg.delete()
-                await update.message.delete()
-                if 'config_prompt_msg_id' in context.user_data:
-                    await context.bot.delete_message(
-                        chat_id=update.effective_chat.id,
-                        message_id=context.user_data['config_prompt_msg_id']
-                    )
-            except Exception:
-                pass
-            context.user_data.clear()
+            _schedule_delayed_cleanup(
+                context.bot,
+                update.effective_chat.id,
+                [msg.message_id, update.message.message_id, context.user_data.get('config_prompt_msg_id')]
+            )
+            _clear_config_user_data(context.user_data)
             return ConversationHandler.END
         
         await update.message.reply_text(
@@ -8012,7 +8095,7 @@ async def handle_config_cancel(update: Update, context: ContextTypes.DEFAULT_TYP
     
     # 清理用户数据
     task_id = context.user_data.get('config_task_id')
-    context.user_data.clear()
+    _clear_config_user_data(context.user_data)
     
     # 返回任务配置界面
     if task_id:
@@ -8159,7 +8242,7 @@ async def handle_config_return(update: Update, context: ContextTypes.DEFAULT_TYP
     task_id = query.data.split('_')[2]
     
     # 清理用户数据
-    context.user_data.clear()
+    _clear_config_user_data(context.user_data)
     
     # 显示任务配置界面
     await show_task_config(query, task_id)
@@ -8167,13 +8250,18 @@ async def handle_config_return(update: Update, context: ContextTypes.DEFAULT_TYP
     return ConversationHandler.END
 
 
-async def show_config_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE, task_id=None):
-    """Helper to show config menu"""
+async def show_config_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE, task_id=None, task_doc=None):
+    """Helper to show config menu
+    
+    Callers that already hold the latest task document (e.g. after an atomic
+    toggle) can pass it as ``task_doc`` to skip the extra read.
+    """
     if task_id is None:
         query = update.callback_query
         task_id = query.data.split('_')[2]
     
-    task_doc = db[Task.COLLECTION_NAME].find_one({'_id': ObjectId(task_id)})
+    if task_doc is None:
+        task_doc = db[Task.COLLECTION_NAME].find_one({'_id': ObjectId(task_id)})
     task = Task.from_dict(task_doc)
     
     query = update.callback_query
@@ -8326,23 +8414,34 @@ async def auto_refresh_task_progress(bot, chat_id, message_id, task_id):
     error_count = 0
     start_time = datetime.now(timezone.utc)
     last_data = None
+    interval = Config.AUTO_REFRESH_FAST_INTERVAL
+    # total_targets 在任务运行期间不变；账号区块仅在账号信息变化时重建
+    total_targets = None
+    last_account_key = None
+    account_section = ""
     
     # Wait a bit for task to actually start
     await asyncio.sleep(2)
     
     while True:
         try:
-            # 获取任务状态 - 强制从数据库读取最新数据
-            task_doc = db[Task.COLLECTION_NAME].find_one({'_id': ObjectId(task_id)})
+            # One clock read per tick, shared by rendering and interval selection
+            now = datetime.now(timezone.utc)
+            
+            # 获取任务状态 - 强制从数据库读取最新数据（同步驱动，放到线程中避免阻塞事件循环）
+            task_doc = await asyncio.to_thread(
+                db[Task.COLLECTION_NAME].find_one, {'_id': ObjectId(task_id)}, _PROGRESS_PROJECTION
+            )
             if not task_doc:
                 logger.info(f"Auto-refresh stopped: Task {task_id} not found")
                 break
             
-            task = Task.from_dict(task_doc)
+            # 热路径直接读取投影后的文档字段，不构造 Task 对象
+            status = task_doc.get('status')
             
             # ✅ Enhanced stop detection - check both DB status and running_tasks
-            if task.status in [TaskStatus.COMPLETED.value, TaskStatus.STOPPED.value, TaskStatus.FAILED.value]:
-                logger.info(f"Auto-refresh stopped: Task {task_id} status is {task.status}")
+            if status in [TaskStatus.COMPLETED.value, TaskStatus.STOPPED.value, TaskStatus.FAILED.value]:
+                logger.info(f"Auto-refresh stopped: Task {task_id} status is {status}")
                 
                 # Wait a moment for completion report to be sent
                 await asyncio.sleep(2)
@@ -8353,112 +8452,40 @@ async def auto_refresh_task_progress(bot, chat_id, message_id, task_id):
                 logger.info(f"Auto-refresh stopped: Task {task_id} not in running_tasks")
                 break
             
-            # 使用任务文档中的 total_targets（已在任务创建时设置）
-            total_targets = task.total_targets
-            sent_count = task.sent_count
-            failed_count = task.failed_count
-            
-            # 计算进度百分比（带验证）
-            if total_targets > 0 and sent_count is not None and failed_count is not None:
-                progress_percent = min(100.0, (sent_count + failed_count) / total_targets * 100)
-            else:
-                progress_percent = 0.0
-            
-            
-            # Calculate progress bar (20 characters)
-            bar_length = 20
-            filled = int(progress_percent / 5)
-            progress_bar = '█' * filled + '░' * (bar_length - filled)
-            
-            # 计算时间和速度
-            runtime_str = "00:00:00"
-            speed_str = "计算中..."
-            remaining_str = "计算中..."
-            
-            if task.started_at:
-                # 确保时区一致 - Fix Bug 1
-                started_at = task.started_at
-                if started_at.tzinfo is None:
-                    started_at = started_at.replace(tzinfo=timezone.utc)
+            # 使用任务文档中的 total_targets（已在任务创建时设置，首次读取后缓存）
+            if total_targets is None:
+                total_targets = task_doc.get('total_targets', 0)
+            sent_count = task_doc.get('sent_count', 0)
+            failed_count = task_doc.get('failed_count', 0)
+            
+            # Update message only if data changed - counters plus the recent log sequence
+            # are enough to detect that; account info and logs are only read after that
+            current_data = (sent_count, failed_count, status, task_manager._get_recent_log_seq(task_id))
+            changed = current_data != last_data
+            if changed:
+                # Get current account info - rebuild section only on rotation or quota change
+                account_info = task_manager._get_current_account(task_id)
+                account_key = (
+                    (account_info['phone'], account_info['sent_today'], account_info['daily_limit'])
+                    if account_info else None
+                )
+                if account_key != last_account_key:
+                    last_account_key = account_key
+                    account_section = _render_account_section(account_info)
                 
-                runtime = datetime.now(timezone.utc) - started_at
-                hours, remainder = divmod(int(runtime.total_seconds()), 3600)
-                minutes, seconds = divmod(remainder, 60)
-                runtime_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+                # Get recent logs
+                recent_logs = task_manager._get_recent_logs(task_id, limit=5)
                 
-                # 计算速度
-                processed = sent_count + failed_count
-                if processed > 0 and runtime.total_seconds() > 0:
-                    speed = processed / runtime.total_seconds() * 60  # messages per minute
-                    speed_str = f"{speed:.1f} 条/分钟"
-                    
-                    # 预计剩余时间
-                    remaining_count = total_targets - processed
-                    if speed > 0:
-                        remaining_seconds = remaining_count / speed * 60
-                        rem_hours, rem_remainder = divmod(int(remaining_seconds), 3600)
-                        rem_minutes, rem_seconds = divmod(rem_remainder, 60)
-                        remaining_str = f"{rem_hours:02d}:{rem_minutes:02d}:{rem_seconds:02d}"
-            
-            # Get current account info
-            account_info = task_manager._get_current_account(task_id)
-            account_section = ""
-            if account_info:
-                masked_phone = mask_phone_number(account_info['phone'])
-                remaining_quota = max(0, account_info['daily_limit'] - account_info['sent_today'])
-                account_section = (
-                    f"\n📱 <b>当前账号</b>\n"
-                    f"• 账号: {masked_phone}\n"
-                    f"• 今日已发: {account_info['sent_today']} 条\n"
-                    f"• 剩余配额: {remaining_quota} 条\n"
+                text = _render_progress_text(
+                    sent_count, failed_count, total_targets, task_doc.get('started_at'),
+                    account_section, _render_logs_section(recent_logs), now
                 )
-            
-            # Get recent logs
-            recent_logs = task_manager._get_recent_logs(task_id, limit=5)
-            logs_section = ""
-            if recent_logs:
-                logs_section = "\n📝 <b>最近操作</b>\n━━━━━━━━━━━━━━━━\n"
-                for log in reversed(recent_logs):  # Show newest first
-                    time_str, status_emoji, target, message = format_log_entry(log)
-                    logs_section += f"{time_str} {status_emoji} {target} {message}\n"
-            
-            # Build enhanced message
-            text = (
-                f"🚀 <b>正在私信中</b>\n\n"
-                f"📊 <b>进度统计</b>\n"
-                f"━━━━━━━━━━━━━━━━\n"
-                f"进度: {sent_count + failed_count}/{total_targets} ({progress_percent:.1f}%)\n"
-                f"<code>{progress_bar}</code>\n\n"
-                f"⏱️ <b>时间统计</b>\n"
-                f"• 已运行: {runtime_str}\n"
-                f"• 预计剩余: {remaining_str}\n"
-                f"• 发送速度: {speed_str}\n"
-                f"{account_section}\n"
-                f"📈 <b>发送统计</b>\n"
-                f"• ✅ 成功: {sent_count}\n"
-                f"• ❌ 失败: {failed_count}\n"
-                f"• ⏸️ 待发送: {total_targets - sent_count - failed_count}\n"
-                f"{logs_section}"
-            )
-            
-            keyboard = [
-                [InlineKeyboardButton("🔄 刷新进度", callback_data=f'task_progress_refresh_{task_id}')],
-                [InlineKeyboardButton("⏹️ 停止任务", callback_data=f'task_stop_{task_id}')]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            # Update message only if data changed
-            # Use both timestamp and count for reliable change detection
-            recent_log_timestamp = recent_logs[-1]['time'] if recent_logs else None
-            recent_log_count = len(recent_logs) if recent_logs else 0
-            current_data = (sent_count, failed_count, task.status, recent_log_timestamp, recent_log_count)
-            if current_data != last_data:
                 try:
                     await bot.edit_message_text(
                         text=text,
                         chat_id=chat_id,
                         message_id=message_id,
-                        reply_markup=reply_markup,
+                        reply_markup=_progress_keyboard(task_id),
                         parse_mode='HTML'
                     )
                     last_data = current_data
@@ -8477,8 +8504,16 @@ async def auto_refresh_task_progress(bot, chat_id, message_id, task_id):
                 break
             
             # Dynamic refresh interval
-            elapsed = (datetime.now(timezone.utc) - start_time).total_seconds()
-            interval = Config.AUTO_REFRESH_FAST_INTERVAL if elapsed < Config.AUTO_REFRESH_FAST_DURATION else random.randint(Config.AUTO_REFRESH_MIN_INTERVAL, Config.AUTO_REFRESH_MAX_INTERVAL)
+            elapsed = (now - start_time).total_seconds()
+            base_interval = Config.AUTO_REFRESH_FAST_INTERVAL if elapsed < Config.AUTO_REFRESH_FAST_DURATION else random.randint(Config.AUTO_REFRESH_MIN_INTERVAL, Config.AUTO_REFRESH_MAX_INTERVAL)
+            if changed:
+                interval = base_interval
+            else:
+                # Nothing moved since the last tick - back off geometrically
+                interval = min(
+                    max(interval * Config.AUTO_REFRESH_BACKOFF_FACTOR, base_interval),
+                    Config.AUTO_REFRESH_IDLE_MAX_INTERVAL
+                )
             await asyncio.sleep(interval)
             
         except Exception as e:
@@ -8508,7 +8543,8 @@ async def send_task_completion_report(bot, chat_id, task_id):
         status_text = "✅ <b>任务完成</b>"
     
     # 统计
-    total_targets = db[Target.COLLECTION_NAME].count_documents({'task_id': str(task_id)})
+    # total_targets 在任务创建时写入；旧任务缺失时才回退到计数查询
+    total_targets = task.total_targets or db[Target.COLLECTION_NAME].count_documents({'task_id': str(task_id)})
     remaining_count = total_targets - task.sent_count - task.failed_count
     success_rate = (task.sent_count / (task.sent_count + task.failed_count) * 100) if (task.sent_count + task.failed_count) > 0 else 0
     
@@ -8522,9 +8558,10 @@ async def send_task_completion_report(bot, chat_id, task_id):
         runtime_str = "未知"
     
     # 账号状态
-    active_accounts = db[Account.COLLECTION_NAME].count_documents({'status': AccountStatus.ACTIVE.value})
-    limited_accounts = db[Account.COLLECTION_NAME].count_documents({'status': AccountStatus.LIMITED.value})
-    banned_accounts = db[Account.COLLECTION_NAME].count_documents({'status': AccountStatus.BANNED.value})
+    account_counts = count_by_field(db[Account.COLLECTION_NAME], 'status')
+    active_accounts = account_counts.get(AccountStatus.ACTIVE.value, 0)
+    limited_accounts = account_counts.get(AccountStatus.LIMITED.value, 0)
+    banned_accounts = account_counts.get(AccountStatus.BANNED.value, 0)
     
     text = (
         f"{status_text}\n\n"
@@ -8669,192 +8706,112 @@ async def refresh_task_progress(query, task_id):
     """刷新任务进度 - 更新进度显示的内联按钮"""
     logger.info(f"刷新任务进度: Task ID={task_id}")
     
-    task_doc = db[Task.COLLECTION_NAME].find_one({'_id': ObjectId(task_id)})
+    task_doc = await asyncio.to_thread(
+        db[Task.COLLECTION_NAME].find_one, {'_id': ObjectId(task_id)}, _PROGRESS_PROJECTION
+    )
     if not task_doc:
         await safe_answer_query(query, "❌ 任务不存在", show_alert=True)
         return
     
-    task = Task.from_dict(task_doc)
-    
-    # Calculate progress
-    total = task.total_targets or 0
-    sent = task.sent_count or 0
-    failed = task.failed_count or 0
-    processed = sent + failed
-    progress_percent = (processed / total * 100) if total > 0 else 0
-    
-    # Progress bar (20 characters)
-    bar_length = 20
-    filled = int(progress_percent / 5)
-    progress_bar = '█' * filled + '░' * (bar_length - filled)
-    
-    # Time calculations
-    runtime_str = "00:00:00"
-    speed_str = "计算中..."
-    remaining_str = "计算中..."
-    
-    if task.started_at:
-        # 确保时区一致 - Fix Bug 1
-        started_at = task.started_at
-        if started_at.tzinfo is None:
-            started_at = started_at.replace(tzinfo=timezone.utc)
-        
-        runtime = datetime.now(timezone.utc) - started_at
-        hours, remainder = divmod(int(runtime.total_seconds()), 3600)
-        minutes, seconds = divmod(remainder, 60)
-        runtime_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-        
-        if processed > 0 and runtime.total_seconds() > 0:
-            speed = processed / runtime.total_seconds() * 60
-            speed_str = f"{speed:.1f} 条/分钟"
-            
-            remaining_count = total - processed
-            if speed > 0:
-                remaining_seconds = remaining_count / speed * 60
-                rem_hours, rem_remainder = divmod(int(remaining_seconds), 3600)
-                rem_minutes, rem_seconds = divmod(rem_remainder, 60)
-                remaining_str = f"{rem_hours:02d}:{rem_minutes:02d}:{rem_seconds:02d}"
-    
-    # Get current account info
-    account_info = task_manager._get_current_account(task_id)
-    account_section = ""
-    if account_info:
-        masked_phone = mask_phone_number(account_info['phone'])
-        remaining_quota = max(0, account_info['daily_limit'] - account_info['sent_today'])
-        account_section = (
-            f"\n📱 <b>当前账号</b>\n"
-            f"• 账号: {masked_phone}\n"
-            f"• 今日已发: {account_info['sent_today']} 条\n"
-            f"• 剩余配额: {remaining_quota} 条\n"
-        )
-    
-    # Get recent logs
-    recent_logs = task_manager._get_recent_logs(task_id, limit=5)
-    logs_section = ""
-    if recent_logs:
-        logs_section = "\n📝 <b>最近操作</b>\n━━━━━━━━━━━━━━━━\n"
-        for log in reversed(recent_logs):  # Show newest first
-            time_str, status_emoji, target, message = format_log_entry(log)
-            logs_section += f"{time_str} {status_emoji} {target} {message}\n"
-    
-    # Build enhanced message
-    text = (
-        f"🚀 <b>正在私信中</b>\n\n"
-        f"📊 <b>进度统计</b>\n"
-        f"━━━━━━━━━━━━━━━━\n"
-        f"进度: {processed}/{total} ({progress_percent:.1f}%)\n"
-        f"<code>{progress_bar}</code>\n\n"
-        f"⏱️ <b>时间统计</b>\n"
-        f"• 已运行: {runtime_str}\n"
-        f"• 预计剩余: {remaining_str}\n"
-        f"• 发送速度: {speed_str}\n"
-        f"{account_section}\n"
-        f"📈 <b>发送统计</b>\n"
-        f"• ✅ 成功: {sent}\n"
-        f"• ❌ 失败: {failed}\n"
-        f"• ⏸️ 待发送: {total - processed}\n"
-        f"{logs_section}"
+    # Read straight from the projected document
+    text = _render_progress_text(
+        task_doc.get('sent_count') or 0,
+        task_doc.get('failed_count') or 0,
+        task_doc.get('total_targets') or 0,
+        task_doc.get('started_at'),
+        _render_account_section(task_manager._get_current_account(task_id)),
+        _render_logs_section(task_manager._get_recent_logs(task_id, limit=5))
     )
     
-    keyboard = [
-        [InlineKeyboardButton("🔄 刷新进度", callback_data=f'task_progress_refresh_{task_id}')],
-        [InlineKeyboardButton("⏹️ 停止任务", callback_data=f'task_stop_{task_id}')]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
     try:
-        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
+        await query.edit_message_text(text, reply_markup=_progress_keyboard(task_id), parse_mode='HTML')
         await safe_answer_query(query, "✅ 进度已刷新")
     except Exception as e:
         logger.error(f"更新进度显示失败: {e}")
         await safe_answer_query(query, "刷新完成")
 
 
-async def export_results(query, task_id):
-    """Export results"""
-    results = task_manager.export_task_results(task_id)
-    if not results:
-        await query.message.reply_text("❌ 任务不存在")
-        return
+async def _reply_export_file(message, path, filename):
+    """Upload one export file as a document reply, skipping empty files"""
+    # Only send non-empty files (Telegram API rejects empty files)
+    try:
+        if os.path.getsize(path) > 0:
+            with open(path, 'rb') as f:
+                await message.reply_document(document=f, filename=filename)
+    except Exception as e:
+        logger.warning(f"Failed to send {filename}: {e}")
+
+
+def _write_export_files(task_id, results):
+    """
+    将任务结果写入三个导出文件（同步阻塞，需在线程中调用）
     
+    Returns:
+        tuple: (success_file, failed_file, log_file)
+    """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
     success_file = os.path.join(Config.RESULTS_DIR, f"success_{task_id}_{timestamp}.txt")
     with open(success_file, 'w', encoding='utf-8') as f:
-        for t in results['success_targets']:
-            f.write(f"{t.username or t.user_id}\n")
+        f.writelines(f"{t.username or t.user_id}\n" for t in results['success_targets'])
     
     failed_file = os.path.join(Config.RESULTS_DIR, f"failed_{task_id}_{timestamp}.txt")
     with open(failed_file, 'w', encoding='utf-8') as f:
-        for t in results['failed_targets']:
-            f.write(f"{t.username or t.user_id}: {t.error_message}\n")
+        f.writelines(f"{t.username or t.user_id}: {t.error_message}\n" for t in results['failed_targets'])
     
     log_file = os.path.join(Config.RESULTS_DIR, f"log_{task_id}_{timestamp}.txt")
     with open(log_file, 'w', encoding='utf-8') as f:
-        for log in results['logs']:
-            status = "成功" if log.success else "失败"
-            f.write(f"[{log.sent_at}] {status}: {log.error_message or 'OK'}\n")
+        f.writelines(
+            f"[{log.sent_at}] {'成功' if log.success else '失败'}: {log.error_message or 'OK'}\n"
+            for log in results['logs']
+        )
     
-    # Only send non-empty files (Telegram API rejects empty files)
-    try:
-        if os.path.getsize(success_file) > 0:
-            with open(success_file, 'rb') as f:
-                await query.message.reply_document(document=f, filename="success.txt")
-    except Exception as e:
-        logger.warning(f"Failed to send success file: {e}")
+    return success_file, failed_file, log_file
+
+
+async def export_results(query, task_id):
+    """Export results"""
+    # Mongo reads and file writes are blocking - keep them off the event loop
+    results = await asyncio.to_thread(task_manager.export_task_results, task_id)
+    if not results:
+        await query.message.reply_text("❌ 任务不存在")
+        return
     
-    try:
-        if os.path.getsize(failed_file) > 0:
-            with open(failed_file, 'rb') as f:
-                await query.message.reply_document(document=f, filename="failed.txt")
-    except Exception as e:
-        logger.warning(f"Failed to send failed file: {e}")
+    success_file, failed_file, log_file = await asyncio.to_thread(_write_export_files, task_id, results)
     
-    try:
-        if os.path.getsize(log_file) > 0:
-            with open(log_file, 'rb') as f:
-                await query.message.reply_document(document=f, filename="log.txt")
-    except Exception as e:
-        logger.warning(f"Failed to send log file: {e}")
+    # Send one after another so the documents always arrive in the same order
+    for path, filename in ((success_file, "success.txt"),
+                           (failed_file, "failed.txt"),
+                           (log_file, "log.txt")):
+        await _reply_export_file(query.message, path, filename)
     
     await query.message.reply_text("✅ 结果已导出")
 
 
+# toggle_type (from callback data) -> (Task field, label)
+_TASK_TOGGLE_FIELDS = {
+    'pin': ('pin_message', '置顶消息'),
+    'delete': ('delete_dialog', '删除对话框'),
+    'repeat': ('repeat_send', '重复发送'),
+}
+
+
 async def toggle_task_config(query, task_id, toggle_type):
     """Toggle task configuration options"""
-    task_doc = db[Task.COLLECTION_NAME].find_one({'_id': ObjectId(task_id)})
+    if toggle_type not in _TASK_TOGGLE_FIELDS:
+        await show_task_config(query, task_id)
+        return
+    field, label = _TASK_TOGGLE_FIELDS[toggle_type]
+    
+    task_doc = _toggle_task_flag(task_id, field)
     if not task_doc:
         await safe_answer_query(query, "❌ 任务不存在", show_alert=True)
         return
     
-    task = Task.from_dict(task_doc)
-    
-    # Toggle the appropriate field
-    if toggle_type == 'pin':
-        task.pin_message = not task.pin_message
-        db[Task.COLLECTION_NAME].update_one(
-            {'_id': ObjectId(task_id)},
-            {'$set': {'pin_message': task.pin_message, 'updated_at': datetime.utcnow()}}
-        )
-        await safe_answer_query(query, f"{'✔️ 已启用' if task.pin_message else '❌ 已禁用'} 置顶消息")
-    elif toggle_type == 'delete':
-        task.delete_dialog = not task.delete_dialog
-        db[Task.COLLECTION_NAME].update_one(
-            {'_id': ObjectId(task_id)},
-            {'$set': {'delete_dialog': task.delete_dialog, 'updated_at': datetime.utcnow()}}
-        )
-        await safe_answer_query(query, f"{'✔️ 已启用' if task.delete_dialog else '❌ 已禁用'} 删除对话框")
-    elif toggle_type == 'repeat':
-        task.repeat_send = not task.repeat_send
-        db[Task.COLLECTION_NAME].update_one(
-            {'_id': ObjectId(task_id)},
-            {'$set': {'repeat_send': task.repeat_send, 'updated_at': datetime.utcnow()}}
-        )
-        await safe_answer_query(query, f"{'✔️ 已启用' if task.repeat_send else '❌ 已禁用'} 重复发送")
+    await safe_answer_query(query, f"{'✔️ 已启用' if task_doc[field] else '❌ 已禁用'} {label}")
     
     # Refresh the config page
-    await show_task_config(query, task_id)
+    await show_task_config(query, task_id, task_doc=task_doc)
 
 
 async def delete_task_handler(query, task_id):
@@ -8887,8 +8844,9 @@ async def delete_task_handler(query, task_id):
 async def show_config(query):
     """Show config"""
     # Get proxy count
-    total_proxies = db[Proxy.COLLECTION_NAME].count_documents({})
-    active_proxies = db[Proxy.COLLECTION_NAME].count_documents({'is_active': True})
+    proxy_counts = count_by_field(secondary_preferred(db[Proxy.COLLECTION_NAME]), 'is_active')
+    total_proxies = sum(proxy_counts.values())
+    active_proxies = proxy_counts.get(True, 0)
     
     text = (
         "⚙️ <b>全局配置</b>\n\n"
@@ -8908,12 +8866,16 @@ async def show_config(query):
 
 async def show_stats(query):
     """Show stats"""
-    total_accounts = db[Account.COLLECTION_NAME].count_documents({})
-    active_accounts = db[Account.COLLECTION_NAME].count_documents({'status': AccountStatus.ACTIVE.value})
-    total_tasks = db[Task.COLLECTION_NAME].count_documents({})
-    completed_tasks = db[Task.COLLECTION_NAME].count_documents({'status': TaskStatus.COMPLETED.value})
-    total_msgs = db[MessageLog.COLLECTION_NAME].count_documents({})
-    success_msgs = db[MessageLog.COLLECTION_NAME].count_documents({'success': True})
+    account_counts = count_by_field(secondary_preferred(db[Account.COLLECTION_NAME]), 'status')
+    task_counts = count_by_field(secondary_preferred(db[Task.COLLECTION_NAME]), 'status')
+    msg_counts = count_by_field(secondary_preferred(db[MessageLog.COLLECTION_NAME]), 'success')
+    
+    total_accounts = sum(account_counts.values())
+    active_accounts = account_counts.get(AccountStatus.ACTIVE.value, 0)
+    total_tasks = sum(task_counts.values())
+    completed_tasks = task_counts.get(TaskStatus.COMPLETED.value, 0)
+    total_msgs = sum(msg_counts.values())
+    success_msgs = msg_counts.get(True, 0)
     
     text = (
         "📊 <b>统计信息</b>\n\n"
@@ -8946,11 +8908,7 @@ async def show_help(query):
 
 async def back_to_main(query):
     """Back to main"""
-    keyboard = [
-        [InlineKeyboardButton("📢 广告私信", callback_data='menu_messaging'), InlineKeyboardButton("👥 采集用户", callback_data='menu_collection')],
-        [InlineKeyboardButton("❓ 帮助", callback_data='menu_help')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = InlineKeyboardMarkup(_main_menu_keyboard())
     text = "🤖 <b>主菜单</b>\n\n请选择："
     await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
 
@@ -8960,8 +8918,9 @@ async def back_to_main(query):
 # ============================================================================
 async def show_proxy_menu(query):
     """Show proxy management menu"""
-    total_proxies = db[Proxy.COLLECTION_NAME].count_documents({})
-    active_proxies = db[Proxy.COLLECTION_NAME].count_documents({'is_active': True})
+    proxy_counts = count_by_field(secondary_preferred(db[Proxy.COLLECTION_NAME]), 'is_active')
+    total_proxies = sum(proxy_counts.values())
+    active_proxies = proxy_counts.get(True, 0)
     
     text = (
         "🌐 <b>代理管理</b>\n\n"
@@ -8985,7 +8944,10 @@ async def show_proxy_menu(query):
 
 async def list_proxies(query):
     """List all proxies"""
-    proxies = list(db[Proxy.COLLECTION_NAME].find().limit(20))
+    proxies = list(db[Proxy.COLLECTION_NAME].find(
+        {},
+        {'proxy_type': 1, 'host': 1, 'port': 1, 'username': 1, 'is_active': 1, 'success_count': 1, 'fail_count': 1}
+    ).limit(20))
     
     if not proxies:
         text = "🌐 <b>代理列表</b>\n\n暂无代理"
@@ -8994,25 +8956,31 @@ async def list_proxies(query):
             [InlineKeyboardButton("🔙 返回", callback_data='config_proxy')]
         ]
     else:
-        text = f"🌐 <b>代理列表</b> (共 {len(proxies)} 个)\n\n"
+        lines = []
         keyboard = []
         
+        # Read the projected fields directly instead of building Proxy objects
         for proxy_doc in proxies:
-            proxy = Proxy.from_dict(proxy_doc)
-            status_emoji = '✅' if proxy.is_active else '❌'
-            auth_info = f"({proxy.username})" if proxy.username else "(无认证)"
-            text += (
-                f"{status_emoji} <code>{proxy.host}:{proxy.port}</code> {auth_info}\n"
-                f"   类型: {proxy.proxy_type} | 成功: {proxy.success_count} | 失败: {proxy.fail_count}\n\n"
+            pid = str(proxy_doc['_id'])
+            host, port = proxy_doc.get('host'), proxy_doc.get('port')
+            is_active = proxy_doc.get('is_active', True)
+            username = proxy_doc.get('username')
+            status_emoji = '✅' if is_active else '❌'
+            auth_info = f"({username})" if username else "(无认证)"
+            lines.append(
+                f"{status_emoji} <code>{host}:{port}</code> {auth_info}\n"
+                f"   类型: {proxy_doc.get('proxy_type')} | 成功: {proxy_doc.get('success_count', 0)} | "
+                f"失败: {proxy_doc.get('fail_count', 0)}\n\n"
             )
             
             # Add action buttons for each proxy
             keyboard.append([
-                InlineKeyboardButton(f"测试 {proxy.host}:{proxy.port}", callback_data=f'proxy_test_{str(proxy._id)}'),
-                InlineKeyboardButton("🔄" if not proxy.is_active else "⏸️", callback_data=f'proxy_toggle_{str(proxy._id)}'),
-                InlineKeyboardButton("🗑️", callback_data=f'proxy_delete_{str(proxy._id)}')
+                InlineKeyboardButton(f"测试 {host}:{port}", callback_data=f'proxy_test_{pid}'),
+                InlineKeyboardButton("🔄" if not is_active else "⏸️", callback_data=f'proxy_toggle_{pid}'),
+                InlineKeyboardButton("🗑️", callback_data=f'proxy_delete_{pid}')
             ])
         
+        text = f"🌐 <b>代理列表</b> (共 {len(proxies)} 个)\n\n" + ''.join(lines)
         keyboard.append([InlineKeyboardButton("🔙 返回", callback_data='config_proxy')])
     
     await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
@@ -9034,23 +9002,30 @@ async def handle_proxy_upload(update: Update, context: ContextTypes.DEFAULT_TYPE
         file_path = os.path.join(Config.UPLOADS_DIR, f"proxies_{user_id}.txt")
         await file.download_to_drive(file_path)
         
-        # Parse and import proxies
+        # Parse proxies, then import them in one unordered batch
         imported_count = 0
         failed_count = 0
+        docs = []
         
         with open(file_path, 'r', encoding='utf-8') as f:
             for line in f:
                 proxy = parse_proxy_line(line)
                 if proxy:
-                    try:
-                        db[Proxy.COLLECTION_NAME].insert_one(proxy.to_dict())
-                        imported_count += 1
-                    except Exception as e:
-                        logger.warning(f"Failed to insert proxy: {e}")
-                        failed_count += 1
+                    docs.append(proxy.to_dict())
                 else:
                     failed_count += 1
         
+        if docs:
+            try:
+                result = db[Proxy.COLLECTION_NAME].insert_many(docs, ordered=False)
+                imported_count = len(result.inserted_ids)
+            except BulkWriteError as e:
+                # ordered=False: valid documents are still inserted, only the bad ones fail
+                imported_count = e.details.get('nInserted', 0)
+                write_errors = e.details.get('writeErrors', [])
+                failed_count += len(write_errors)
+                logger.warning(f"Failed to insert {len(write_errors)} proxies: {write_errors[:3]}")
+        
         # Clean up
         os.remove(file_path)
         context.user_data['waiting_for'] = None
@@ -9080,6 +9055,148 @@ async def handle_proxy_upload(update: Update, context: ContextTypes.DEFAULT_TYPE
 # ============================================================================
 # MAIN
 # ============================================================================
+def _run_once_migration(db, marker_id, collection_name, query, update, description):
+    """
+    执行一次性数据迁移（通过 schema_versions 标记只执行一次）
+    
+    Returns:
+        int: 修改的文档数；已执行过时返回 None
+    """
+    if db['schema_versions'].find_one({'_id': marker_id}, {'_id': 1}) is not None:
+        logger.info(f"{description} migration already applied, skipping")
+        return None
+    
+    # 迁移条件只匹配尚未迁移的文档，重复执行无副作用：标记在迁移成功后才写入，
+    # 进程中途退出或多个实例同时启动时，未完成的迁移会在下次启动时重新执行
+    logger.info(f"Running database migration for {description}...")
+    modified = db[collection_name].update_many(query, update).modified_count
+    db['schema_versions'].update_one(
+        {'_id': marker_id},
+        {'$setOnInsert': {'v': 1, 'applied_at': datetime.utcnow()}},
+        upsert=True
+    )
+    return modified
+
+
+def _run_account_migrations(db):
+    """数据迁移：为已存在的账户补齐 account_type 与 session_format 字段"""
+    modified = _run_once_migration(
+        db, 'accounts.account_type', Account.COLLECTION_NAME,
+        {'account_type': {'$exists': False}},
+        {'$set': {'account_type': 'messaging'}},
+        'account_type'
+    )
+    if modified:
+        logger.info(f"Migrated {modified} existing accounts to messaging type")
+    elif modified == 0:
+        logger.info("No accounts needed migration")
+    
+    # 旧账户的 session_name 以 .session+json 结尾时记为 session+json，其余均为 Telethon .session
+    modified = _run_once_migration(
+        db, 'accounts.session_format', Account.COLLECTION_NAME,
+        {'session_format': {'$exists': False}},
+        [{'$set': {'session_format': {'$cond': [
+            {'$regexMatch': {'input': {'$ifNull': ['$session_name', '']}, 'regex': r'\.session\+json$'}},
+            'session+json',
+            'session'
+        ]}}}],
+        'session_format'
+    )
+    if modified:
+        logger.info(f"Backfilled session_format on {modified} existing accounts")
+
+
+# 处理器共用的消息过滤器（只构建一次，所有状态复用同一个过滤器对象）
+_TEXT_FILTER = filters.TEXT & ~filters.COMMAND
+_DOC_FILTER = filters.Document.ALL & ~filters.COMMAND
+_MEDIA_FILTER = (filters.Document.ALL | filters.PHOTO | filters.VIDEO) & ~filters.COMMAND
+_TEXT_OR_DOC_FILTER = (filters.TEXT | filters.Document.ALL) & ~filters.COMMAND
+
+# 会话处理器的回调模式（预编译、整串锚定；task_id / account_id 均为 24 位十六进制 ObjectId）
+_OID = r'[0-9a-f]{24}'
+_CFG_CANCEL_RE = re.compile(rf'^cfg_cancel_{_OID}$', re.ASCII)
+_CFG_EXAMPLE_RE = re.compile(r'^cfg_example_[a-z_]+$', re.ASCII)
+_CFG_RETURN_RE = re.compile(rf'^task_config_{_OID}$', re.ASCII)
+_UPLOAD_SESSION_RE = re.compile(r'^upload_session_file$', re.ASCII)
+_UPLOAD_TDATA_RE = re.compile(r'^upload_tdata_file$', re.ASCII)
+_TASKS_CREATE_RE = re.compile(r'^tasks_create$', re.ASCII)
+_COLL_CREATE_RE = re.compile(r'^collection_create$', re.ASCII)
+_COLL_TYPE_RE = re.compile(r'^coll_type_[a-z_]+$', re.ASCII)
+_COLL_ACCOUNT_RE = re.compile(rf'^coll_account_{_OID}$', re.ASCII)
+_COLL_CONFIGURE_FILTERS_RE = re.compile(r'^coll_configure_filters$', re.ASCII)
+_COLL_FILTER_TOGGLE_RE = re.compile(r'^coll_filter_toggle_[a-z_]+$', re.ASCII)
+_COLL_CREATE_NOW_RE = re.compile(r'^coll_create_now$', re.ASCII)
+
+
+def _config_state(message_handler, with_example=True):
+    """
+    构建配置会话中单个输入状态的处理器列表
+    
+    Args:
+        message_handler: 处理文本输入的回调
+        with_example: 是否包含「查看示例」按钮处理器
+    """
+    handlers = [
+        MessageHandler(_TEXT_FILTER, message_handler),
+        CallbackQueryHandler(handle_config_cancel, pattern=_CFG_CANCEL_RE)
+    ]
+    if with_example:
+        handlers.append(CallbackQueryHandler(show_config_example, pattern=_CFG_EXAMPLE_RE))
+    handlers.append(CallbackQueryHandler(handle_config_return, pattern=_CFG_RETURN_RE))
+    return handlers
+
+
+# 配置会话入口：回调前缀 -> 处理函数（前缀互不相同；较长前缀须排在其前缀之前）
+_CFG_ENTRY_HANDLERS = {
+    'cfg_thread_interval_': request_thread_interval_config,
+    'cfg_thread_': request_thread_config,
+    'cfg_interval_': request_interval_config,
+    'cfg_bidirect_': request_bidirect_config,
+    'cfg_daily_limit_': request_daily_limit_config,
+    'cfg_retry_': request_retry_config,
+    'cfg_reply_mode_': request_reply_mode_config,
+    'set_batch_count_': request_batch_count_config,
+    'set_batch_delay_': request_batch_delay_config,
+}
+# 只匹配上述前缀，其它 cfg_* 回调（如 cfg_toggle_）仍交给 button_handler
+_CFG_ENTRY_RE = re.compile(
+    '^(' + '|'.join(map(re.escape, _CFG_ENTRY_HANDLERS)) + rf'){_OID}$', re.ASCII
+)
+
+
+async def _dispatch_config_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """配置会话的单一入口：一次正则匹配得到前缀，再按字典分发"""
+    prefix = _CFG_ENTRY_RE.match(update.callback_query.data).group(1)
+    return await _CFG_ENTRY_HANDLERS[prefix](update, context)
+
+
+def _install_event_loop_policy():
+    """
+    选择可用的最快事件循环策略：uringcore (Linux ≥ 5.11) → uvloop → asyncio 默认
+    
+    Returns:
+        str: 实际使用的事件循环名称
+    """
+    if platform.system() == 'Linux':
+        match = re.match(r'(\d+)\.(\d+)', os.uname().release)
+        if match and (int(match.group(1)), int(match.group(2))) >= (5, 11):
+            try:
+                import uringcore
+                asyncio.set_event_loop_policy(uringcore.EventLoopPolicy())
+                return 'uringcore'
+            except (ImportError, AttributeError) as e:
+                # 未安装或安装的版本缺少 EventLoopPolicy
+                logger.info(f"uringcore unavailable ({e}), falling back")
+    
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        return 'uvloop'
+    except (ImportError, AttributeError) as e:
+        logger.info(f"uvloop unavailable ({e}), falling back to the default asyncio event loop")
+        return 'asyncio'
+
+
 def main():
     """Main function"""
     global account_manager, task_manager, collection_manager, db
@@ -9104,41 +9221,52 @@ def main():
     db = init_db(Config.MONGODB_URI, Config.MONGODB_DATABASE)
     logger.info("Database initialized successfully")
     
-    # 数据迁移：为已存在的账户添加默认 account_type
-    logger.info("Running database migration for account_type...")
-    migration_result = db[Account.COLLECTION_NAME].update_many(
-        {'account_type': {'$exists': False}},
-        {'$set': {'account_type': 'messaging'}}
-    )
-    if migration_result.modified_count > 0:
-        logger.info(f"Migrated {migration_result.modified_count} existing accounts to messaging type")
-    else:
-        logger.info("No accounts needed migration")
+    # 数据迁移在后台线程执行，与下面的管理器初始化和处理器注册重叠；开始轮询前等待完成
+    migration_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='account-migrations')
+    migration_future = migration_executor.submit(_run_account_migrations, db)
+    migration_executor.shutdown(wait=False)  # 已提交的迁移照常执行，完成后线程退出
     
-    logger.info("Initializing caiji module database...")
-    caiji.init_db(db)
-    logger.info("Caiji module database initialized")
+    if Config.ENABLE_COLLECTION:
+        logger.info("Initializing caiji module database...")
+        caiji.init_db(db)
+        logger.info("Caiji module database initialized")
     
     logger.info("Initializing account manager...")
     account_manager = AccountManager(db)
     logger.info("Account manager initialized")
     
+    # 可选：更快的事件循环（需在 run_polling 创建事件循环之前设置策略）
+    logger.info(f"Using {_install_event_loop_policy()} event loop")
+    
     logger.info("Initializing task manager...")
     # 先创建application以便传递给TaskManager
     logger.info("Building bot application...")
-    application = Application.builder().token(Config.BOT_TOKEN).build()
+    # get_me() 会在 run_polling 的 initialize() 阶段执行，连接池借此完成预热
+    application = (
+        Application.builder()
+        .token(Config.BOT_TOKEN)
+        .connection_pool_size(Config.BOT_CONNECTION_POOL_SIZE)
+        .pool_timeout(Config.BOT_POOL_TIMEOUT)
+        .get_updates_connection_pool_size(8)
+        .get_updates_pool_timeout(Config.BOT_POOL_TIMEOUT)
+        .http_version('1.1')
+        .build()
+    )
     
     # 创建task_manager时传入bot_application
     task_manager = TaskManager(db, account_manager, application)
     logger.info("Task manager initialized with bot application")
     
-    logger.info("Initializing collection manager...")
-    collection_manager = CollectionManager(db, account_manager)
-    logger.info("Collection manager initialized")
-    
-    logger.info("Initializing caiji module collection manager...")
-    caiji.init_collection_manager(collection_manager)
-    logger.info("Caiji module collection manager initialized")
+    if Config.ENABLE_COLLECTION:
+        logger.info("Initializing collection manager...")
+        collection_manager = CollectionManager(db, account_manager)
+        logger.info("Collection manager initialized")
+        
+        logger.info("Initializing caiji module collection manager...")
+        caiji.init_collection_manager(collection_manager)
+        logger.info("Caiji module collection manager initialized")
+    else:
+        logger.info("Collection feature disabled (ENABLE_COLLECTION=0)")
     
     logger.info("Registering command handlers...")
     application.add_handler(CommandHandler("start", start))
@@ -9147,16 +9275,16 @@ def main():
     logger.info("Registering file upload conversation handler...")
     upload_conv = ConversationHandler(
         entry_points=[
-            CallbackQueryHandler(request_session_upload, pattern='^upload_session_file$'),
-            CallbackQueryHandler(request_tdata_upload, pattern='^upload_tdata_file$')
+            CallbackQueryHandler(request_session_upload, pattern=_UPLOAD_SESSION_RE),
+            CallbackQueryHandler(request_tdata_upload, pattern=_UPLOAD_TDATA_RE)
         ],
         states={
             SESSION_UPLOAD: [
-                MessageHandler(filters.Document.ALL & ~filters.COMMAND, handle_file_upload),
+                MessageHandler(_DOC_FILTER, handle_file_upload),
                 CallbackQueryHandler(button_handler)
             ],
             TDATA_UPLOAD: [
-                MessageHandler(filters.Document.ALL & ~filters.COMMAND, handle_file_upload),
+                MessageHandler(_DOC_FILTER, handle_file_upload),
                 CallbackQueryHandler(button_handler)
             ]
         },
@@ -9167,34 +9295,34 @@ def main():
     # Task creation conversation handler
     logger.info("Registering task conversation handler...")
     task_conv = ConversationHandler(
-        entry_points=[CallbackQueryHandler(start_create_task, pattern='^tasks_create$')],
+        entry_points=[CallbackQueryHandler(start_create_task, pattern=_TASKS_CREATE_RE)],
         states={
             TASK_NAME_INPUT: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_task_name),
+                MessageHandler(_TEXT_FILTER, handle_task_name),
                 CallbackQueryHandler(button_handler)
             ],
             MESSAGE_INPUT: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message_input),
+                MessageHandler(_TEXT_FILTER, handle_message_input),
                 CallbackQueryHandler(button_handler)
             ],
             FORMAT_SELECT: [CallbackQueryHandler(button_handler)],
             SEND_METHOD_SELECT: [CallbackQueryHandler(button_handler)],
             POSTBOT_CODE_INPUT: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_postbot_code_input),
+                MessageHandler(_TEXT_FILTER, handle_postbot_code_input),
                 CallbackQueryHandler(button_handler)
             ],
             CHANNEL_LINK_INPUT: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_channel_link_input),
+                MessageHandler(_TEXT_FILTER, handle_channel_link_input),
                 CallbackQueryHandler(button_handler)
             ],
             PREVIEW_CONFIG: [CallbackQueryHandler(button_handler)],
             MEDIA_SELECT: [CallbackQueryHandler(button_handler)],
             MEDIA_UPLOAD: [
-                MessageHandler((filters.Document.ALL | filters.PHOTO | filters.VIDEO) & ~filters.COMMAND, handle_media_upload),
+                MessageHandler(_MEDIA_FILTER, handle_media_upload),
                 CallbackQueryHandler(button_handler)
             ],
             TARGET_INPUT: [
-                MessageHandler((filters.TEXT | filters.Document.ALL) & ~filters.COMMAND, handle_target_input),
+                MessageHandler(_TEXT_OR_DOC_FILTER, handle_target_input),
                 CallbackQueryHandler(button_handler)  # Allow clicking config buttons to exit TARGET_INPUT
             ]
         },
@@ -9206,115 +9334,66 @@ def main():
     # Task configuration conversation handler
     logger.info("Registering task configuration conversation handler...")
     config_conv = ConversationHandler(
-        entry_points=[
-            CallbackQueryHandler(request_thread_interval_config, pattern='^cfg_thread_interval_'),
-            CallbackQueryHandler(request_thread_config, pattern='^cfg_thread_'),
-            CallbackQueryHandler(request_interval_config, pattern='^cfg_interval_'),
-            CallbackQueryHandler(request_bidirect_config, pattern='^cfg_bidirect_'),
-            CallbackQueryHandler(request_daily_limit_config, pattern='^cfg_daily_limit_'),
-            CallbackQueryHandler(request_retry_config, pattern='^cfg_retry_'),
-            CallbackQueryHandler(request_reply_mode_config, pattern='^cfg_reply_mode_'),
-            CallbackQueryHandler(request_batch_count_config, pattern='^set_batch_count_'),
-            CallbackQueryHandler(request_batch_delay_config, pattern='^set_batch_delay_')
-        ],
+        entry_points=[CallbackQueryHandler(_dispatch_config_entry, pattern=_CFG_ENTRY_RE)],
         states={
-            CONFIG_THREAD_INPUT: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_thread_config),
-                CallbackQueryHandler(handle_config_cancel, pattern='^cfg_cancel_'),
-                CallbackQueryHandler(show_config_example, pattern='^cfg_example_'),
-                CallbackQueryHandler(handle_config_return, pattern='^task_config_')
-            ],
-            CONFIG_INTERVAL_MIN_INPUT: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_interval_config),
-                CallbackQueryHandler(handle_config_cancel, pattern='^cfg_cancel_'),
-                CallbackQueryHandler(show_config_example, pattern='^cfg_example_'),
-                CallbackQueryHandler(handle_config_return, pattern='^task_config_')
-            ],
-            CONFIG_BIDIRECT_INPUT: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_bidirect_config),
-                CallbackQueryHandler(handle_config_cancel, pattern='^cfg_cancel_'),
-                CallbackQueryHandler(show_config_example, pattern='^cfg_example_'),
-                CallbackQueryHandler(handle_config_return, pattern='^task_config_')
-            ],
-            CONFIG_THREAD_INTERVAL_INPUT: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_thread_interval_config),
-                CallbackQueryHandler(handle_config_cancel, pattern='^cfg_cancel_'),
-                CallbackQueryHandler(show_config_example, pattern='^cfg_example_'),
-                CallbackQueryHandler(handle_config_return, pattern='^task_config_')
-            ],
-            CONFIG_DAILY_LIMIT_INPUT: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_daily_limit_config),
-                CallbackQueryHandler(handle_config_cancel, pattern='^cfg_cancel_'),
-                CallbackQueryHandler(show_config_example, pattern='^cfg_example_'),
-                CallbackQueryHandler(handle_config_return, pattern='^task_config_')
-            ],
-            CONFIG_RETRY_INPUT: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_retry_config),
-                CallbackQueryHandler(handle_config_cancel, pattern='^cfg_cancel_'),
-                CallbackQueryHandler(show_config_example, pattern='^cfg_example_'),
-                CallbackQueryHandler(handle_config_return, pattern='^task_config_')
-            ],
-            CONFIG_REPLY_MODE_INPUT: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_reply_mode_config),
-                CallbackQueryHandler(handle_config_cancel, pattern='^cfg_cancel_'),
-                CallbackQueryHandler(show_config_example, pattern='^cfg_example_'),
-                CallbackQueryHandler(handle_config_return, pattern='^task_config_')
-            ],
-            CONFIG_BATCH_COUNT_INPUT: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_batch_count_config),
-                CallbackQueryHandler(handle_config_cancel, pattern='^cfg_cancel_'),
-                CallbackQueryHandler(handle_config_return, pattern='^task_config_')
-            ],
-            CONFIG_BATCH_DELAY_INPUT: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_batch_delay_config),
-                CallbackQueryHandler(handle_config_cancel, pattern='^cfg_cancel_'),
-                CallbackQueryHandler(handle_config_return, pattern='^task_config_')
-            ]
+            CONFIG_THREAD_INPUT: _config_state(handle_thread_config),
+            CONFIG_INTERVAL_MIN_INPUT: _config_state(handle_interval_config),
+            CONFIG_BIDIRECT_INPUT: _config_state(handle_bidirect_config),
+            CONFIG_THREAD_INTERVAL_INPUT: _config_state(handle_thread_interval_config),
+            CONFIG_DAILY_LIMIT_INPUT: _config_state(handle_daily_limit_config),
+            CONFIG_RETRY_INPUT: _config_state(handle_retry_config),
+            CONFIG_REPLY_MODE_INPUT: _config_state(handle_reply_mode_config),
+            CONFIG_BATCH_COUNT_INPUT: _config_state(handle_batch_count_config, with_example=False),
+            CONFIG_BATCH_DELAY_INPUT: _config_state(handle_batch_delay_config, with_example=False)
         },
         fallbacks=[
             CommandHandler("start", start),
-            CallbackQueryHandler(handle_config_cancel, pattern='^cfg_cancel_')
+            CallbackQueryHandler(handle_config_cancel, pattern=_CFG_CANCEL_RE)
         ]
     )
     application.add_handler(config_conv)
     
-    # Collection conversation handler
-    logger.info("Registering collection conversation handler...")
-    collection_conv = ConversationHandler(
-        entry_points=[CallbackQueryHandler(caiji.start_create_collection, pattern='^collection_create$')],
-        states={
-            caiji.COLLECTION_NAME_INPUT: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, caiji.handle_collection_name),
-                CallbackQueryHandler(button_handler)
-            ],
-            caiji.COLLECTION_TYPE_SELECT: [CallbackQueryHandler(caiji.handle_collection_type, pattern='^coll_type_')],
-            caiji.COLLECTION_ACCOUNT_SELECT: [CallbackQueryHandler(caiji.handle_collection_account, pattern='^coll_account_')],
-            caiji.COLLECTION_TARGET_INPUT: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, caiji.handle_collection_target),
-                CallbackQueryHandler(button_handler)
-            ],
-            caiji.COLLECTION_KEYWORD_INPUT: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, caiji.handle_collection_keyword),
-                CallbackQueryHandler(button_handler)
-            ],
-            caiji.COLLECTION_FILTER_CONFIG: [
-                CallbackQueryHandler(caiji.show_filter_config, pattern='^coll_configure_filters$'),
-                CallbackQueryHandler(caiji.toggle_filter, pattern='^coll_filter_toggle_'),
-                CallbackQueryHandler(caiji.create_collection_now, pattern='^coll_create_now$')
-            ]
-        },
-        fallbacks=[CommandHandler("start", start)]
-    )
-    application.add_handler(collection_conv)
+    if Config.ENABLE_COLLECTION:
+        # Collection conversation handler
+        logger.info("Registering collection conversation handler...")
+        collection_conv = ConversationHandler(
+            entry_points=[CallbackQueryHandler(caiji.start_create_collection, pattern=_COLL_CREATE_RE)],
+            states={
+                caiji.COLLECTION_NAME_INPUT: [
+                    MessageHandler(_TEXT_FILTER, caiji.handle_collection_name),
+                    CallbackQueryHandler(button_handler)
+                ],
+                caiji.COLLECTION_TYPE_SELECT: [CallbackQueryHandler(caiji.handle_collection_type, pattern=_COLL_TYPE_RE)],
+                caiji.COLLECTION_ACCOUNT_SELECT: [CallbackQueryHandler(caiji.handle_collection_account, pattern=_COLL_ACCOUNT_RE)],
+                caiji.COLLECTION_TARGET_INPUT: [
+                    MessageHandler(_TEXT_FILTER, caiji.handle_collection_target),
+                    CallbackQueryHandler(button_handler)
+                ],
+                caiji.COLLECTION_KEYWORD_INPUT: [
+                    MessageHandler(_TEXT_FILTER, caiji.handle_collection_keyword),
+                    CallbackQueryHandler(button_handler)
+                ],
+                caiji.COLLECTION_FILTER_CONFIG: [
+                    CallbackQueryHandler(caiji.show_filter_config, pattern=_COLL_CONFIGURE_FILTERS_RE),
+                    CallbackQueryHandler(caiji.toggle_filter, pattern=_COLL_FILTER_TOGGLE_RE),
+                    CallbackQueryHandler(caiji.create_collection_now, pattern=_COLL_CREATE_NOW_RE)
+                ]
+            },
+            fallbacks=[CommandHandler("start", start)]
+        )
+        application.add_handler(collection_conv)
     
     # Proxy file upload handler (for document uploads when waiting for proxy file)
     logger.info("Registering proxy file upload handler...")
-    application.add_handler(MessageHandler(filters.Document.ALL & ~filters.COMMAND, handle_proxy_upload))
+    application.add_handler(MessageHandler(_DOC_FILTER, handle_proxy_upload))
     
     # General button handler (registered AFTER conversation handlers)
     logger.info("Registering general button handler...")
     application.add_handler(CallbackQueryHandler(button_handler))
     
+    # 账户数据必须在处理第一个更新前迁移完毕；迁移失败时异常在这里重新抛出，中止启动
+    migration_future.result()
+    
     logger.info("=" * 80)
     logger.info("Bot started successfully! Listening for updates...")
     logger.info("=" * 80)
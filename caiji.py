@@ -3,22 +3,34 @@ Telegram 用户采集模块
 支持从多种渠道采集目标用户
 """
 
+import csv
 import enum
 import asyncio
 import logging
-from datetime import datetime
-from bson import ObjectId
+from datetime import datetime, timedelta
+from bson import ObjectId, has_c as bson_has_c
+from pymongo import IndexModel, UpdateOne, ReadPreference, WriteConcern
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram import error as telegram_error
 from telegram.ext import ConversationHandler
 from telethon import TelegramClient
+from telethon.tl.functions.channels import GetParticipantsRequest
+from telethon.tl.functions.contacts import SearchRequest
 from telethon.tl.functions.messages import GetHistoryRequest, GetRepliesRequest
-from telethon.tl.types import InputPeerEmpty, PeerChannel, PeerUser
+from telethon.tl.types import InputPeerEmpty, PeerChannel, PeerUser, Channel, Chat, ChannelParticipantsSearch
 from telethon.errors import (
     FloodWaitError, ChatAdminRequiredError, ChannelPrivateError,
     UsernameNotOccupiedError, UsernameInvalidError
 )
 import re
+from collections import OrderedDict
+
+# cryptg: C 实现的 AES-IGE，Telethon 导入时自动检测并使用（大量拉取成员/消息时显著降低 CPU）
+try:
+    import cryptg  # noqa: F401
+    HAS_CRYPTG = True
+except ImportError:
+    HAS_CRYPTG = False
 
 logger = logging.getLogger(__name__)
 
@@ -28,12 +40,20 @@ logger = logging.getLogger(__name__)
 # ============================================================================
 _db = None
 _collection_manager = None
+_menu_stats_cache = {}  # {key: (expires_at, value)}
+_menu_stats_locks = {}  # {key: asyncio.Lock}
 
 
 def init_db(database):
     """初始化数据库实例"""
     global _db
     _db = database
+    if HAS_CRYPTG:
+        logger.info(f"cryptg {getattr(cryptg, '__version__', '')} detected, Telethon crypto is accelerated")
+    else:
+        logger.warning("cryptg not installed, Telethon falls back to pure-Python AES (pip install cryptg)")
+    if not bson_has_c():
+        logger.warning("bson C extension not available, bulk inserts use the pure-Python BSON encoder")
 
 
 def init_collection_manager(manager):
@@ -60,7 +80,70 @@ def _get_collection_manager():
 # 常量
 # ============================================================================
 # Telegram username pattern (5-32 characters, alphanumeric and underscore)
-USERNAME_PATTERN = r'[a-zA-Z0-9_]{5,32}'
+USERNAME_PATTERN = re.compile(r'[a-zA-Z0-9_]{5,32}')
+# 预编译的提取模式：@username 与 t.me/username 合并为一个交替，单次扫描文本
+USERNAME_REF_PATTERN = re.compile(rf'(?:@|t\.me/)({USERNAME_PATTERN.pattern})')
+
+# 成员采集批量写入：每批文档数与生产者/消费者队列深度
+HARVEST_BATCH_SIZE = 500
+HARVEST_QUEUE_SIZE = 4
+# 成员列表每页条数（Telegram 上限 200）
+PARTICIPANTS_PAGE_SIZE = 200
+# 导出时游标每批拉取的文档数
+EXPORT_BATCH_SIZE = 1000
+# 导出 CSV 的列
+USER_EXPORT_FIELDS = ['user_id', 'username', 'first_name', 'last_name', 'tags']
+GROUP_EXPORT_FIELDS = ['group_id', 'title', 'username', 'link', 'member_count', 'is_public']
+
+# 采集可用的账户 session 格式（对应 accounts.session_format 字段）
+COLLECTION_SESSION_FORMATS = ['session', 'session+json']
+
+# 菜单统计缓存时长（秒）：连续点击菜单时复用同一份统计
+MENU_STATS_TTL = 5
+# 采集账户列表最多显示的条数（Telegram 消息长度上限约 4096 字符）
+ACCOUNT_LIST_LIMIT = 50
+# 采集任务列表每页条数
+COLLECTION_PAGE_SIZE = 5
+# 采集进度写回数据库的间隔（条）；结束时总会再写一次最终值
+PROGRESS_UPDATE_INTERVAL = 500
+# 频道采集时并发请求（用户名解析 / 评论拉取）的最大数，以及用户名解析结果缓存的条数上限
+RESOLVE_CONCURRENCY = 8
+ENTITY_CACHE_SIZE = 10000
+# 采集时每个账户每秒最多发起的 Telegram 请求数，以及 FloodWait 后的重试次数
+COLLECT_RPC_RATE = 20
+FLOOD_WAIT_RETRIES = 3
+
+# 模型默认时间戳来源（模块级绑定，批量构造时省去属性查找）
+_NOW = datetime.utcnow
+_EPOCH = datetime(1970, 1, 1)
+_MS = timedelta(milliseconds=1)
+
+# 列表 / 详情页的展示映射（模块级常量，渲染时只做查找）
+_STATUS_EMOJI = {
+    'pending': '⏸️',
+    'running': '🔄',
+    'paused': '⏸️',
+    'completed': '✅',
+    'failed': '❌'
+}
+_TYPE_NAME = {
+    'public_group': '公开群组',
+    'private_group': '私有群组',
+    'channel_post': '频道帖子',
+    'channel_comment': '频道评论',
+    'keyword_search': '关键词搜索'
+}
+_ACCOUNT_STATUS_EMOJI = {'active': '✅', 'banned': '🚫', 'limited': '⚠️', 'inactive': '❌'}
+# 采集列表页读取的字段
+_COLLECTION_LIST_FIELDS = {
+    'name': 1, 'status': 1, 'collection_type': 1,
+    'collected_users': 1, 'collected_groups': 1, 'created_at': 1
+}
+# 采集详情页读取的字段（不含 filters 等详情页不展示的内容）
+_COLLECTION_DETAIL_FIELDS = {
+    'name': 1, 'status': 1, 'collection_type': 1, 'collected_users': 1, 'collected_groups': 1,
+    'target_link': 1, 'keyword': 1, 'started_at': 1, 'completed_at': 1, 'error_message': 1
+}
 
 
 # ============================================================================
@@ -90,6 +173,11 @@ class CollectionStatus(enum.Enum):
 class Collection:
     """采集任务模型"""
     COLLECTION_NAME = 'collections'
+    __slots__ = (
+        '_id', 'name', 'collection_type', 'status', 'account_id', 'target_link', 'keyword',
+        'filters', 'collected_users', 'collected_groups', 'created_at', 'started_at',
+        'completed_at', 'updated_at', 'error_message'
+    )
     
     def __init__(self, name, collection_type, status=None, account_id=None,
                  target_link=None, keyword=None, filters=None,
@@ -106,10 +194,12 @@ class Collection:
         self.filters = filters or {}
         self.collected_users = collected_users
         self.collected_groups = collected_groups
-        self.created_at = created_at or datetime.utcnow()
+        # 两个默认时间戳共用一次时钟读取
+        now = _NOW() if created_at is None or updated_at is None else None
+        self.created_at = created_at or now
         self.started_at = started_at
         self.completed_at = completed_at
-        self.updated_at = updated_at or datetime.utcnow()
+        self.updated_at = updated_at or now
         self.error_message = error_message
     
     def to_dict(self):
@@ -161,6 +251,10 @@ class Collection:
 class CollectedUser:
     """采集用户模型"""
     COLLECTION_NAME = 'collected_users'
+    __slots__ = (
+        '_id', 'collection_id', 'user_id', 'username', 'first_name', 'last_name', 'phone',
+        'is_premium', 'is_admin', 'has_photo', 'last_seen', 'created_at'
+    )
     
     def __init__(self, collection_id, user_id=None, username=None, 
                  first_name=None, last_name=None, phone=None,
@@ -177,7 +271,7 @@ class CollectedUser:
         self.is_admin = is_admin
         self.has_photo = has_photo
         self.last_seen = last_seen
-        self.created_at = created_at or datetime.utcnow()
+        self.created_at = created_at or _NOW()
     
     def to_dict(self):
         """转换为字典"""
@@ -217,11 +311,40 @@ class CollectedUser:
             created_at=doc.get('created_at'),
             _id=doc.get('_id')
         )
+    
+    @classmethod
+    def bulk_insert(cls, collection, docs):
+        """
+        批量写入采集用户（按 collection_id + user_id 去重，已存在的不覆盖）
+        
+        Args:
+            collection: collected_users 集合（可带 write_concern 等选项）
+            docs: to_dict() 生成的文档列表
+            
+        Returns:
+            int: 新插入的文档数；无确认写入（w=0）时为 None
+        """
+        if not docs:
+            return 0
+        ops = [
+            UpdateOne(
+                {'collection_id': doc['collection_id'], 'user_id': doc['user_id']},
+                {'$setOnInsert': doc},
+                upsert=True
+            )
+            for doc in docs
+        ]
+        result = collection.bulk_write(ops, ordered=False)
+        return result.upserted_count if result.acknowledged else None
 
 
 class CollectedGroup:
     """采集群组模型"""
     COLLECTION_NAME = 'collected_groups'
+    __slots__ = (
+        '_id', 'collection_id', 'group_id', 'title', 'username', 'link', 'member_count',
+        'is_public', 'description', 'created_at'
+    )
     
     def __init__(self, collection_id, group_id=None, title=None, username=None,
                  link=None, member_count=0, is_public=True, description=None,
@@ -235,7 +358,7 @@ class CollectedGroup:
         self.member_count = member_count
         self.is_public = is_public
         self.description = description
-        self.created_at = created_at or datetime.utcnow()
+        self.created_at = created_at or _NOW()
     
     def to_dict(self):
         """转换为字典"""
@@ -271,6 +394,49 @@ class CollectedGroup:
             created_at=doc.get('created_at'),
             _id=doc.get('_id')
         )
+    
+    @classmethod
+    def bulk_insert(cls, collection, docs):
+        """
+        批量写入采集群组（按 collection_id + group_id 去重，已存在的不覆盖）
+        
+        Args:
+            collection: collected_groups 集合（可带 write_concern 等选项）
+            docs: to_dict() 生成的文档列表
+            
+        Returns:
+            int: 新插入的文档数；无确认写入（w=0）时为 None
+        """
+        if not docs:
+            return 0
+        ops = [
+            UpdateOne(
+                {'collection_id': doc['collection_id'], 'group_id': doc['group_id']},
+                {'$setOnInsert': doc},
+                upsert=True
+            )
+            for doc in docs
+        ]
+        result = collection.bulk_write(ops, ordered=False)
+        return result.upserted_count if result.acknowledged else None
+
+
+class RateLimiter:
+    """按固定间隔放行请求的异步限速器（rate 次 / period 秒）"""
+    
+    def __init__(self, rate, period=1.0):
+        self._interval = period / rate
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """等待到下一个可用时间片"""
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            wait = self._next_at - now
+            self._next_at = max(now, self._next_at) + self._interval
+        if wait > 0:
+            await asyncio.sleep(wait)
 
 
 # ============================================================================
@@ -281,11 +447,36 @@ class CollectionManager:
     
     def __init__(self, db, account_manager):
         self.db = db
+        self.collections_col = db[Collection.COLLECTION_NAME]
+        self.users_col = db[CollectedUser.COLLECTION_NAME]
+        self.groups_col = db[CollectedGroup.COLLECTION_NAME]
+        # 采集数据只追加、可容忍极少量丢失：采集中途的批量写入不等待确认（w=0），省去每批一次往返；
+        # 采集结束时的缓冲写入、任务状态变更与删除仍走默认的确认写入。
+        # 注意：无确认写入可能经连接池中的其他连接发出，服务端不保证它们先于之后的确认写入处理完，
+        # 任务刚标记完成时立即导出/删除，仍可能与最后几批在途写入交错
+        self.users_write = self.users_col.with_options(write_concern=WriteConcern(w=0))
+        self.groups_write = self.groups_col.with_options(write_concern=WriteConcern(w=0))
+        # 列表类只读查询优先走从节点，减轻主节点（采集写入）压力
+        self.collections_read = self.collections_col.with_options(read_preference=ReadPreference.SECONDARY_PREFERRED)
         self.account_manager = account_manager
         self.running_collections = {}  # {collection_id: task}
         self.stop_flags = {}  # {collection_id: bool}
+        # 待写入缓冲：{collection_id: [doc, ...]}，满 HARVEST_BATCH_SIZE 条或采集结束时批量写入
+        self._user_buffers = {}
+        self._group_buffers = {}
+        # 已采集 ID 集合：{collection_id: set(user_id/group_id)}，启动时一次性预加载，去重只查内存
+        self._seen_users = {}
+        self._seen_groups = {}
+        self._limiters = {}  # {account_id: RateLimiter}
+        # 用户名解析结果（LRU）：{(account_id, username_lower): entity 或 None(用户名不存在)}
+        self._entity_cache = OrderedDict()
         logger.info("CollectionManager initialized")
     
+    @staticmethod
+    async def _db(fn, *args, **kwargs):
+        """在线程池中执行同步的 PyMongo 调用，避免阻塞事件循环（Telethon 的收发在同一循环上）"""
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    
     async def create_collection(self, name, collection_type, account_id, 
                                target_link=None, keyword=None, filters=None):
         """创建采集任务"""
@@ -298,15 +489,16 @@ class CollectionManager:
             filters=filters
         )
         
-        result = self.db[Collection.COLLECTION_NAME].insert_one(collection.to_dict())
+        result = await self._db(self.collections_col.insert_one, collection.to_dict())
         collection._id = result.inserted_id
+        invalidate_menu_stats()
         
         logger.info(f"Created collection {collection._id}: {name}")
         return collection
     
     async def start_collection(self, collection_id):
         """开始采集任务"""
-        collection_doc = self.db[Collection.COLLECTION_NAME].find_one({'_id': ObjectId(collection_id)})
+        collection_doc = await self._db(self.collections_col.find_one, {'_id': ObjectId(collection_id)})
         if not collection_doc:
             raise ValueError("采集任务不存在")
         
@@ -316,15 +508,18 @@ class CollectionManager:
             raise ValueError("采集任务已在运行中")
         
         # 更新状态
-        self.db[Collection.COLLECTION_NAME].update_one(
-            {'_id': ObjectId(collection_id)},
+        now = _NOW()
+        await self._db(self.collections_col.update_one,
+            {'_id': collection._id},
             {'$set': {
                 'status': CollectionStatus.RUNNING.value,
-                'started_at': datetime.utcnow(),
-                'updated_at': datetime.utcnow()
+                'started_at': now,
+                'updated_at': now
             }}
         )
         
+        invalidate_menu_stats()
+        
         # 创建采集任务
         self.stop_flags[str(collection_id)] = False
         task = asyncio.create_task(self._run_collection(collection))
@@ -335,17 +530,19 @@ class CollectionManager:
     
     async def stop_collection(self, collection_id):
         """停止采集任务"""
-        collection_id_str = str(collection_id)
+        oid = ObjectId(collection_id)
+        collection_id_str = str(oid)
         
         if collection_id_str not in self.running_collections:
             # 如果不在运行中，直接更新状态
-            self.db[Collection.COLLECTION_NAME].update_one(
-                {'_id': ObjectId(collection_id)},
+            await self._db(self.collections_col.update_one,
+                {'_id': oid},
                 {'$set': {
                     'status': CollectionStatus.PAUSED.value,
                     'updated_at': datetime.utcnow()
                 }}
             )
+            invalidate_menu_stats()
             return True
         
         # 设置停止标志
@@ -358,6 +555,11 @@ class CollectionManager:
                 await asyncio.wait_for(task, timeout=10.0)
             except asyncio.TimeoutError:
                 task.cancel()
+                # 等待取消真正完成（finally 中的写入与清理执行完毕），不留下悬挂的任务
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
         
         # 清理
         if collection_id_str in self.running_collections:
@@ -366,14 +568,15 @@ class CollectionManager:
             del self.stop_flags[collection_id_str]
         
         # 更新状态
-        self.db[Collection.COLLECTION_NAME].update_one(
-            {'_id': ObjectId(collection_id)},
+        await self._db(self.collections_col.update_one,
+            {'_id': oid},
             {'$set': {
                 'status': CollectionStatus.PAUSED.value,
                 'updated_at': datetime.utcnow()
             }}
         )
         
+        invalidate_menu_stats()
         logger.info(f"Stopped collection {collection_id}")
         return True
     
@@ -382,6 +585,21 @@ class CollectionManager:
         collection_id_str = str(collection._id)
         
         try:
+            # 预加载已采集的 ID（继续之前暂停的任务时避免重复写入）
+            self._seen_users[collection_id_str], self._seen_groups[collection_id_str] = await asyncio.gather(
+                self._db(self._load_seen_ids, self.users_col, 'user_id', collection._id),
+                self._db(self._load_seen_ids, self.groups_col, 'group_id', collection._id)
+            )
+            # 以已保存的条数作为任务计数的起点，本次运行的新采集再以增量累加上去；
+            # 同时校正上次运行中途失败、未来得及计入进度的部分
+            await self._db(self.collections_col.update_one,
+                {'_id': collection._id},
+                {'$set': {
+                    'collected_users': len(self._seen_users[collection_id_str]),
+                    'collected_groups': len(self._seen_groups[collection_id_str])
+                }}
+            )
+
             # 获取账户客户端
             client = await self.account_manager.get_client(collection.account_id)
             
@@ -398,19 +616,20 @@ class CollectionManager:
             
             # 更新状态为完成
             if not self.stop_flags.get(collection_id_str, False):
-                self.db[Collection.COLLECTION_NAME].update_one(
+                now = _NOW()
+                await self._db(self.collections_col.update_one,
                     {'_id': collection._id},
                     {'$set': {
                         'status': CollectionStatus.COMPLETED.value,
-                        'completed_at': datetime.utcnow(),
-                        'updated_at': datetime.utcnow()
+                        'completed_at': now,
+                        'updated_at': now
                     }}
                 )
                 logger.info(f"Collection {collection._id} completed successfully")
         
         except Exception as e:
             logger.error(f"Collection {collection._id} failed: {e}")
-            self.db[Collection.COLLECTION_NAME].update_one(
+            await self._db(self.collections_col.update_one,
                 {'_id': collection._id},
                 {'$set': {
                     'status': CollectionStatus.FAILED.value,
@@ -420,11 +639,105 @@ class CollectionManager:
             )
         
         finally:
+            # 写入缓冲中剩余的数据（停止/失败时同样保留已采集的部分）
+            await self._flush_buffers(collection._id)
+            
             # 清理
             if collection_id_str in self.running_collections:
                 del self.running_collections[collection_id_str]
             if collection_id_str in self.stop_flags:
                 del self.stop_flags[collection_id_str]
+            self._seen_users.pop(collection_id_str, None)
+            self._seen_groups.pop(collection_id_str, None)
+            invalidate_menu_stats()  # 状态已变为完成/失败
+            # 刷新中途出错时未写入的缓冲在这里一并释放
+            self._user_buffers.pop(collection_id_str, None)
+            self._group_buffers.pop(collection_id_str, None)
+    
+    def _get_limiter(self, account_id):
+        """获取（必要时创建）账户的请求限速器"""
+        limiter = self._limiters.get(account_id)
+        if limiter is None:
+            limiter = self._limiters[account_id] = RateLimiter(COLLECT_RPC_RATE)
+        return limiter
+    
+    async def _rpc(self, account_id, make_request):
+        """
+        经账户限速器发起 Telethon 请求；遇到 FloodWait 时按服务器要求的秒数等待后重试
+        
+        Args:
+            account_id: 采集账户ID（每个账户独立限速）
+            make_request: 无参函数，每次调用返回一个新的请求协程
+        """
+        limiter = self._get_limiter(account_id)
+        for attempt in range(FLOOD_WAIT_RETRIES + 1):
+            await limiter.acquire()
+            try:
+                return await make_request()
+            except FloodWaitError as e:
+                if attempt == FLOOD_WAIT_RETRIES:
+                    raise
+                wait = e.seconds + 2 ** attempt
+                logger.warning(f"FloodWait on account {account_id}: sleeping {wait}s (attempt {attempt + 1})")
+                await asyncio.sleep(wait)
+    
+    async def _iter_participants(self, client, account_id, entity):
+        """
+        逐个产出群组成员
+        
+        超级群组/频道手动分页拉取，处理当前页的同时预取下一页；
+        普通群组一次即可取全，直接使用 iter_participants。
+        """
+        if not isinstance(entity, Channel):
+            async for user in client.iter_participants(entity):
+                yield user
+            return
+        
+        def fetch(offset):
+            return asyncio.create_task(self._rpc(account_id, lambda: client(GetParticipantsRequest(
+                entity, ChannelParticipantsSearch(''), offset, PARTICIPANTS_PAGE_SIZE, hash=0
+            ))))
+        
+        offset = 0
+        next_page = fetch(offset)
+        try:
+            while True:
+                page = await next_page
+                if not page.participants:
+                    break
+                offset += len(page.participants)
+                next_page = fetch(offset)
+                
+                # users 中还包含邀请人等关联用户，须以 participants 为准；
+                # 与 iter_participants 一致，把成员身份挂到 user.participant 上（管理员过滤依赖它）
+                users = {user.id: user for user in page.users}
+                for participant in page.participants:
+                    user = users.get(getattr(participant, 'user_id', None))
+                    if user is None:
+                        continue
+                    user.participant = participant
+                    yield user
+        finally:
+            next_page.cancel()
+    
+    async def _update_progress(self, collection_id, field, delta):
+        """
+        将新采集的条数累加到采集任务的计数上
+        
+        用 $inc 增量而非 $set 绝对值：计数始终是任务累计总数，
+        继续已暂停/已完成的任务时不会被本次运行的条数覆盖
+        """
+        if not delta:
+            return
+        await self._db(self.collections_col.update_one,
+            {'_id': collection_id},
+            {'$inc': {field: delta}, '$set': {'updated_at': _NOW()}}
+        )
+    
+    @staticmethod
+    def _load_seen_ids(col, field, collection_id):
+        """一次投影查询取出某采集任务已保存的全部 ID"""
+        return {doc[field] for doc in col.find({'collection_id': collection_id}, {field: 1, '_id': 0})}
     
     async def _collect_public_group(self, client, collection):
         """采集公开群组成员"""
@@ -432,49 +745,91 @@ class CollectionManager:
         
         try:
             # 解析群组链接
-            group_entity = await client.get_entity(collection.target_link)
+            group_entity = await self._rpc(collection.account_id, lambda: client.get_entity(collection.target_link))
             
-            # 获取所有成员
+            # 获取所有成员：生产者拉取并过滤，消费者在线程池中批量写入，两者重叠执行
             filters = collection.filters or {}
+            seen_users = self._seen_users.setdefault(collection_id_str, set())
             collected_count = 0
+            queue = asyncio.Queue(maxsize=HARVEST_QUEUE_SIZE)
             
-            async for user in client.iter_participants(group_entity, aggressive=True):
-                # 检查停止标志
-                if self.stop_flags.get(collection_id_str, False):
-                    logger.info(f"Collection {collection._id} stopped by user")
-                    break
-                
-                # 应用过滤器
-                if not self._apply_user_filters(user, filters):
-                    continue
-                
-                # 保存用户
-                await self._save_collected_user(collection._id, user, group_entity)
-                collected_count += 1
-                
-                # 更新进度
-                if collected_count % 10 == 0:
-                    self.db[Collection.COLLECTION_NAME].update_one(
-                        {'_id': collection._id},
-                        {'$set': {
-                            'collected_users': collected_count,
-                            'updated_at': datetime.utcnow()
-                        }}
-                    )
+            async def produce():
+                nonlocal collected_count
+                batch = []
+                batch_now = _NOW()  # 同一批文档共用一个时间戳
+                members = self._iter_participants(client, collection.account_id, group_entity)
+                try:
+                    async for user in members:
+                        # 检查停止标志
+                        if self.stop_flags.get(collection_id_str, False):
+                            logger.info(f"Collection {collection._id} stopped by user")
+                            break
+                        
+                        # 已采集过的跳过
+                        if user.id in seen_users:
+                            continue
+                        
+                        # 应用过滤器
+                        if not self._apply_user_filters(user, filters):
+                            continue
+                        
+                        seen_users.add(user.id)
+                        batch.append(self._build_collected_user_doc(collection._id, user, group_entity, batch_now))
+                        collected_count += 1
+                        if len(batch) >= HARVEST_BATCH_SIZE:
+                            await queue.put(batch)
+                            batch = []
+                            batch_now = _NOW()
+                    
+                    if batch:
+                        await queue.put(batch)
+                except Exception:
+                    # 出错时同样通知消费者结束（取消时消费者会一并被取消，无需通知）
+                    await queue.put(None)
+                    raise
+                finally:
+                    # 提前结束（停止/出错）时取消预取中的下一页
+                    await members.aclose()
+                await queue.put(None)  # 结束标记
+            
+            async def consume():
+                pending_delta = 0  # 已写入、尚未计入任务进度的条数
+                batch = await queue.get()
+                while batch is not None:
+                    # 先取下一批：当前批是最后一批时改用确认写入，任务标记完成前最后的数据已落库
+                    next_batch = await queue.get()
+                    col = self.users_write if next_batch is not None else self.users_col
+                    try:
+                        await self._db(CollectedUser.bulk_insert, col, batch)
+                    except Exception as e:
+                        # 写入失败的批次不计入进度，并移出已采集集合，之后再遇到时可重新采集
+                        logger.error(f"Error saving collected users batch: {e}")
+                        seen_users.difference_update(doc['user_id'] for doc in batch)
+                        batch = next_batch
+                        continue
+                    pending_delta += len(batch)
+                    batch = next_batch
+                    
+                    # 更新进度（每 PROGRESS_UPDATE_INTERVAL 条写一次）
+                    if pending_delta >= PROGRESS_UPDATE_INTERVAL:
+                        await self._update_progress(collection._id, 'collected_users', pending_delta)
+                        pending_delta = 0
                 
-                # 防止频率限制
-                await asyncio.sleep(0.1)
+                # 最终更新（生产者出错或被停止时同样计入已写入的批次）
+                await self._update_progress(collection._id, 'collected_users', pending_delta)
             
-            # 最终更新
-            self.db[Collection.COLLECTION_NAME].update_one(
-                {'_id': collection._id},
-                {'$set': {
-                    'collected_users': collected_count,
-                    'updated_at': datetime.utcnow()
-                }}
-            )
+            # 生产者出错时会先发结束标记，消费者写完已入队的批次后返回，再抛出生产者的异常；
+            # 消费者出错（或整体被取消）时生产者可能阻塞在已满的队列上，必须主动取消
+            producer = asyncio.create_task(produce())
+            try:
+                await consume()
+            except BaseException:
+                producer.cancel()
+                await asyncio.gather(producer, return_exceptions=True)
+                raise
+            await producer
             
-            logger.info(f"Collected {collected_count} users from public group")
+            logger.info(f"Collected {collected_count} new users from public group ({len(self._seen_users.get(collection_id_str, ()))} in task total)")
         
         except FloodWaitError as e:
             logger.warning(f"FloodWait: need to wait {e.seconds} seconds")
@@ -492,7 +847,7 @@ class CollectionManager:
         
         try:
             # 解析群组链接
-            group_entity = await client.get_entity(collection.target_link)
+            group_entity = await self._rpc(collection.account_id, lambda: client.get_entity(collection.target_link))
             
             # 获取消息历史
             filters = collection.filters or {}
@@ -500,8 +855,10 @@ class CollectionManager:
             max_id = filters.get('max_message_id', 0)
             limit = filters.get('message_limit', 1000)
             
-            collected_users = set()
+            # 去重直接使用任务级的已采集集合，不再另建一份本地集合
+            seen_users = self._seen_users.setdefault(collection_id_str, set())
             collected_count = 0
+            pending_delta = 0  # 尚未计入任务进度的新采集条数
             
             async for message in client.iter_messages(group_entity, limit=limit, 
                                                      min_id=min_id, max_id=max_id if max_id > 0 else None):
@@ -515,7 +872,7 @@ class CollectionManager:
                     user_id = message.sender.id
                     
                     # 避免重复
-                    if user_id in collected_users:
+                    if user_id in seen_users:
                         continue
                     
                     # 应用过滤器
@@ -523,32 +880,22 @@ class CollectionManager:
                         continue
                     
                     # 保存用户
-                    await self._save_collected_user(collection._id, message.sender, group_entity)
-                    collected_users.add(user_id)
+                    if not await self._save_collected_user(collection._id, message.sender, group_entity):
+                        continue
                     collected_count += 1
+                    pending_delta += 1
                     
-                    # 更新进度
-                    if collected_count % 10 == 0:
-                        self.db[Collection.COLLECTION_NAME].update_one(
-                            {'_id': collection._id},
-                            {'$set': {
-                                'collected_users': collected_count,
-                                'updated_at': datetime.utcnow()
-                            }}
-                        )
-                
-                await asyncio.sleep(0.05)
+                    # 更新进度（每 PROGRESS_UPDATE_INTERVAL 条累加一次）
+                    if pending_delta >= PROGRESS_UPDATE_INTERVAL:
+                        await self._update_progress(collection._id, 'collected_users', pending_delta)
+                        pending_delta = 0
+            
+            await self._flush_buffers(collection._id)
             
             # 最终更新
-            self.db[Collection.COLLECTION_NAME].update_one(
-                {'_id': collection._id},
-                {'$set': {
-                    'collected_users': collected_count,
-                    'updated_at': datetime.utcnow()
-                }}
-            )
+            await self._update_progress(collection._id, 'collected_users', pending_delta)
             
-            logger.info(f"Collected {collected_count} active users from private group")
+            logger.info(f"Collected {collected_count} new active users from private group ({len(self._seen_users.get(collection_id_str, ()))} in task total)")
         
         except Exception as e:
             logger.error(f"Error collecting private group: {e}")
@@ -560,7 +907,7 @@ class CollectionManager:
         
         try:
             # 解析频道链接
-            channel_entity = await client.get_entity(collection.target_link)
+            channel_entity = await self._rpc(collection.account_id, lambda: client.get_entity(collection.target_link))
             
             # 获取帖子
             filters = collection.filters or {}
@@ -568,6 +915,30 @@ class CollectionManager:
             
             collected_usernames = set()
             collected_count = 0
+            pending_delta = 0  # 尚未计入任务进度的新采集条数
+            resolve_sem = asyncio.BoundedSemaphore(RESOLVE_CONCURRENCY)
+            
+            async def resolve(username):
+                """解析用户名，失败返回 None；结果按账户缓存，跨帖子、跨任务复用"""
+                key = (collection.account_id, username)
+                if key in self._entity_cache:
+                    self._entity_cache.move_to_end(key)
+                    return self._entity_cache[key]
+                
+                async with resolve_sem:
+                    try:
+                        user = await self._rpc(collection.account_id, lambda: client.get_entity(username))
+                    except (UsernameNotOccupiedError, UsernameInvalidError):
+                        user = None
+                    except Exception as e:
+                        # 临时错误不缓存，之后再遇到时重试
+                        logger.warning(f"Error getting user {username}: {e}")
+                        return None
+                
+                self._entity_cache[key] = user
+                if len(self._entity_cache) > ENTITY_CACHE_SIZE:
+                    self._entity_cache.popitem(last=False)
+                return user
             
             async for message in client.iter_messages(channel_entity, limit=limit):
                 # 检查停止标志
@@ -577,60 +948,41 @@ class CollectionManager:
                 
                 # 提取用户名和链接
                 if message.text:
-                    # 提取 @username
-                    usernames = re.findall(f'@({USERNAME_PATTERN})', message.text)
-                    # 提取 t.me/username
-                    telegram_links = re.findall(rf't\.me/({USERNAME_PATTERN})', message.text)
+                    # 提取 @username 与 t.me/username
+                    # Telegram 用户名不区分大小写，按小写去重
+                    all_usernames = {u.lower() for u in USERNAME_REF_PATTERN.findall(message.text)}
+                    new_usernames = [u for u in all_usernames if u not in collected_usernames]
                     
-                    all_usernames = set(usernames + telegram_links)
+                    # 并发解析本条帖子中的新用户名
+                    users = await asyncio.gather(*(resolve(u) for u in new_usernames))
+                    now = _NOW()
                     
-                    for username in all_usernames:
-                        if username in collected_usernames:
+                    for username, user in zip(new_usernames, users):
+                        if user is None:
                             continue
                         
-                        try:
-                            # 尝试获取用户信息
-                            user = await client.get_entity(username)
-                            
-                            # 应用过滤器
-                            if not self._apply_user_filters(user, filters):
-                                continue
-                            
-                            # 保存用户
-                            await self._save_collected_user(collection._id, user, None)
-                            collected_usernames.add(username)
-                            collected_count += 1
-                            
-                            # 更新进度
-                            if collected_count % 5 == 0:
-                                self.db[Collection.COLLECTION_NAME].update_one(
-                                    {'_id': collection._id},
-                                    {'$set': {
-                                        'collected_users': collected_count,
-                                        'updated_at': datetime.utcnow()
-                                    }}
-                                )
-                            
-                            await asyncio.sleep(0.2)
-                        
-                        except (UsernameNotOccupiedError, UsernameInvalidError):
+                        # 应用过滤器
+                        if not self._apply_user_filters(user, filters):
                             continue
-                        except Exception as e:
-                            logger.warning(f"Error getting user {username}: {e}")
+                        
+                        # 保存用户
+                        collected_usernames.add(username)
+                        if not await self._save_collected_user(collection._id, user, None, now):
                             continue
-                
-                await asyncio.sleep(0.1)
+                        collected_count += 1
+                        pending_delta += 1
+                        
+                        # 更新进度（每 PROGRESS_UPDATE_INTERVAL 条累加一次）
+                        if pending_delta >= PROGRESS_UPDATE_INTERVAL:
+                            await self._update_progress(collection._id, 'collected_users', pending_delta)
+                            pending_delta = 0
+            
+            await self._flush_buffers(collection._id)
             
             # 最终更新
-            self.db[Collection.COLLECTION_NAME].update_one(
-                {'_id': collection._id},
-                {'$set': {
-                    'collected_users': collected_count,
-                    'updated_at': datetime.utcnow()
-                }}
-            )
+            await self._update_progress(collection._id, 'collected_users', pending_delta)
             
-            logger.info(f"Collected {collected_count} users from channel posts")
+            logger.info(f"Collected {collected_count} new users from channel posts ({len(self._seen_users.get(collection_id_str, ()))} in task total)")
         
         except Exception as e:
             logger.error(f"Error collecting channel posts: {e}")
@@ -642,15 +994,19 @@ class CollectionManager:
         
         try:
             # 解析频道链接
-            channel_entity = await client.get_entity(collection.target_link)
+            channel_entity = await self._rpc(collection.account_id, lambda: client.get_entity(collection.target_link))
             
             # 获取帖子
             filters = collection.filters or {}
             post_limit = filters.get('post_limit', 50)
             
-            collected_users = set()
+            # 去重直接使用任务级的已采集集合，不再另建一份本地集合
+            seen_users = self._seen_users.setdefault(collection_id_str, set())
             collected_count = 0
+            pending_delta = 0  # 尚未计入任务进度的新采集条数
             
+            # 先列出有评论的帖子
+            post_ids = []
             async for message in client.iter_messages(channel_entity, limit=post_limit):
                 # 检查停止标志
                 if self.stop_flags.get(collection_id_str, False):
@@ -658,60 +1014,54 @@ class CollectionManager:
                     break
                 
                 # 检查是否有评论
-                if not message.replies or message.replies.replies == 0:
-                    continue
-                
-                try:
-                    # 获取评论
-                    async for reply_message in client.iter_messages(
-                        channel_entity,
-                        reply_to=message.id,
-                        limit=100
-                    ):
-                        if reply_message.sender and hasattr(reply_message.sender, 'id'):
-                            user_id = reply_message.sender.id
-                            
-                            # 避免重复
-                            if user_id in collected_users:
-                                continue
-                            
-                            # 应用过滤器
-                            if not self._apply_user_filters(reply_message.sender, filters):
-                                continue
-                            
-                            # 保存用户
-                            await self._save_collected_user(collection._id, reply_message.sender, channel_entity)
-                            collected_users.add(user_id)
-                            collected_count += 1
-                            
-                            # 更新进度
-                            if collected_count % 10 == 0:
-                                self.db[Collection.COLLECTION_NAME].update_one(
-                                    {'_id': collection._id},
-                                    {'$set': {
-                                        'collected_users': collected_count,
-                                        'updated_at': datetime.utcnow()
-                                    }}
-                                )
+                if message.replies and message.replies.replies:
+                    post_ids.append(message.id)
+            
+            reply_sem = asyncio.BoundedSemaphore(RESOLVE_CONCURRENCY)
+            
+            async def replies_of(post_id):
+                """拉取单个帖子的评论（计为一次请求），失败返回空列表"""
+                async with reply_sem:
+                    if self.stop_flags.get(collection_id_str, False):
+                        return []
+                    try:
+                        await self._get_limiter(collection.account_id).acquire()
+                        return [r async for r in client.iter_messages(channel_entity, reply_to=post_id, limit=100)]
+                    except Exception as e:
+                        logger.warning(f"Error getting replies for message {post_id}: {e}")
+                        return []
+            
+            # 并发拉取各帖子的评论，再按帖子顺序处理
+            for replies in await asyncio.gather(*(replies_of(post_id) for post_id in post_ids)):
+                for reply_message in replies:
+                    if reply_message.sender and hasattr(reply_message.sender, 'id'):
+                        user_id = reply_message.sender.id
                         
-                        await asyncio.sleep(0.1)
-                
-                except Exception as e:
-                    logger.warning(f"Error getting replies for message {message.id}: {e}")
-                    continue
-                
-                await asyncio.sleep(0.2)
+                        # 避免重复
+                        if user_id in seen_users:
+                            continue
+                        
+                        # 应用过滤器
+                        if not self._apply_user_filters(reply_message.sender, filters):
+                            continue
+                        
+                        # 保存用户
+                        if not await self._save_collected_user(collection._id, reply_message.sender, channel_entity):
+                            continue
+                        collected_count += 1
+                        pending_delta += 1
+                        
+                        # 更新进度（每 PROGRESS_UPDATE_INTERVAL 条累加一次）
+                        if pending_delta >= PROGRESS_UPDATE_INTERVAL:
+                            await self._update_progress(collection._id, 'collected_users', pending_delta)
+                            pending_delta = 0
+            
+            await self._flush_buffers(collection._id)
             
             # 最终更新
-            self.db[Collection.COLLECTION_NAME].update_one(
-                {'_id': collection._id},
-                {'$set': {
-                    'collected_users': collected_count,
-                    'updated_at': datetime.utcnow()
-                }}
-            )
+            await self._update_progress(collection._id, 'collected_users', pending_delta)
             
-            logger.info(f"Collected {collected_count} users from channel comments")
+            logger.info(f"Collected {collected_count} new users from channel comments ({len(self._seen_users.get(collection_id_str, ()))} in task total)")
         
         except Exception as e:
             logger.error(f"Error collecting channel comments: {e}")
@@ -726,52 +1076,63 @@ class CollectionManager:
             filters = collection.filters or {}
             limit = filters.get('search_limit', 50)
             
+            keyword_lower = keyword.lower()
             collected_count = 0
+            pending_delta = 0  # 尚未计入任务进度的新采集条数
             
-            # 搜索公开群组/频道
-            async for dialog in client.iter_dialogs(limit=None):
-                # 检查停止标志
-                if self.stop_flags.get(collection_id_str, False):
-                    logger.info(f"Collection {collection._id} stopped by user")
-                    break
-                
-                # 检查是否匹配关键词
-                if not dialog.is_channel and not dialog.is_group:
-                    continue
-                
-                if not dialog.title or keyword.lower() not in dialog.title.lower():
-                    continue
-                
-                # 保存群组/频道
-                await self._save_collected_group(collection._id, dialog)
-                collected_count += 1
-                
-                # 更新进度
-                if collected_count % 5 == 0:
-                    self.db[Collection.COLLECTION_NAME].update_one(
-                        {'_id': collection._id},
-                        {'$set': {
-                            'collected_groups': collected_count,
-                            'updated_at': datetime.utcnow()
-                        }}
-                    )
-                
-                # 达到限制
-                if collected_count >= limit:
-                    break
-                
-                await asyncio.sleep(0.2)
+            # 搜索公开群组/频道（服务端匹配关键词，一次请求）
+            try:
+                result = await self._rpc(collection.account_id, lambda: client(SearchRequest(q=keyword, limit=limit)))
+                now = _NOW()
+                for chat in result.chats:
+                    if collected_count >= limit:
+                        break
+                    if not isinstance(chat, (Channel, Chat)):
+                        continue
+                    if await self._save_collected_group(collection._id, chat, now):
+                        collected_count += 1
+                        pending_delta += 1
+            except FloodWaitError:
+                raise
+            except Exception as e:
+                logger.warning(f"Server-side search failed for '{keyword}', falling back to dialogs: {e}")
+            
+            # 服务端结果不足时，从账户已加入的对话中补充
+            if collected_count < limit:
+                async for dialog in client.iter_dialogs(limit=None):
+                    # 检查停止标志
+                    if self.stop_flags.get(collection_id_str, False):
+                        logger.info(f"Collection {collection._id} stopped by user")
+                        break
+                    
+                    # 检查是否匹配关键词
+                    if not dialog.is_channel and not dialog.is_group:
+                        continue
+                    
+                    if not dialog.title or keyword_lower not in dialog.title.lower():
+                        continue
+                    
+                    # 保存群组/频道（已由服务端搜索收录的跳过）
+                    if not await self._save_collected_group(collection._id, dialog.entity):
+                        continue
+                    collected_count += 1
+                    pending_delta += 1
+                    
+                    # 更新进度（每 PROGRESS_UPDATE_INTERVAL 条累加一次）
+                    if pending_delta >= PROGRESS_UPDATE_INTERVAL:
+                        await self._update_progress(collection._id, 'collected_groups', pending_delta)
+                        pending_delta = 0
+                    
+                    # 达到限制
+                    if collected_count >= limit:
+                        break
+            
+            await self._flush_buffers(collection._id)
             
             # 最终更新
-            self.db[Collection.COLLECTION_NAME].update_one(
-                {'_id': collection._id},
-                {'$set': {
-                    'collected_groups': collected_count,
-                    'updated_at': datetime.utcnow()
-                }}
-            )
+            await self._update_progress(collection._id, 'collected_groups', pending_delta)
             
-            logger.info(f"Found {collected_count} groups/channels matching keyword")
+            logger.info(f"Found {collected_count} new groups/channels matching keyword ({len(self._seen_groups.get(collection_id_str, ()))} in task total)")
         
         except Exception as e:
             logger.error(f"Error in keyword search: {e}")
@@ -809,56 +1170,70 @@ class CollectionManager:
         
         return True
     
-    async def _save_collected_user(self, collection_id, user, source_entity):
-        """保存采集的用户"""
+    def _build_collected_user_doc(self, collection_id, user, source_entity, now=None):
+        """由 Telethon 用户对象构建采集用户文档（now 可由调用方按批次复用）"""
+        # 检查是否为管理员
+        is_admin = False
+        if source_entity and hasattr(user, 'participant'):
+            is_admin = hasattr(user.participant, 'admin_rights') and user.participant.admin_rights is not None
+        
+        # 直接构建与 CollectedUser.to_dict() 相同结构的文档，省去中间对象
+        return {
+            'collection_id': collection_id,
+            'user_id': user.id,
+            'username': getattr(user, 'username', None),
+            'first_name': getattr(user, 'first_name', None),
+            'last_name': getattr(user, 'last_name', None),
+            'phone': getattr(user, 'phone', None),
+            'is_premium': getattr(user, 'premium', False),
+            'is_admin': is_admin,
+            'has_photo': bool(getattr(user, 'photo', None)),
+            'last_seen': getattr(user.status, 'was_online', None) if hasattr(user, 'status') else None,
+            'created_at': now or _NOW()
+        }
+    
+    async def _save_collected_user(self, collection_id, user, source_entity, now=None):
+        """
+        保存采集的用户（先写入缓冲，满一批再批量落库）
+        
+        Returns:
+            bool: 是否为本任务新采集到的用户（调用方据此累加进度增量；
+                  任务计数在启动时已按已保存的条数校正，所以始终是任务累计总数）
+        """
         try:
-            # 检查是否已存在
-            existing = self.db[CollectedUser.COLLECTION_NAME].find_one({
-                'collection_id': collection_id,
-                'user_id': user.id
-            })
-            
-            if existing:
-                return
-            
-            # 检查是否为管理员
-            is_admin = False
-            if source_entity and hasattr(user, 'participant'):
-                is_admin = hasattr(user.participant, 'admin_rights') and user.participant.admin_rights is not None
-            
-            # 创建用户记录
-            collected_user = CollectedUser(
-                collection_id=collection_id,
-                user_id=user.id,
-                username=getattr(user, 'username', None),
-                first_name=getattr(user, 'first_name', None),
-                last_name=getattr(user, 'last_name', None),
-                phone=getattr(user, 'phone', None),
-                is_premium=getattr(user, 'premium', False),
-                is_admin=is_admin,
-                has_photo=bool(getattr(user, 'photo', None)),
-                last_seen=getattr(user.status, 'was_online', None) if hasattr(user, 'status') else None
-            )
+            # 内存去重
+            seen = self._seen_users.setdefault(str(collection_id), set())
+            if user.id in seen:
+                return False
+            seen.add(user.id)
             
-            # 保存到数据库
-            self.db[CollectedUser.COLLECTION_NAME].insert_one(collected_user.to_dict())
+            buffer = self._user_buffers.setdefault(str(collection_id), [])
+            buffer.append(self._build_collected_user_doc(collection_id, user, source_entity, now))
+            if len(buffer) >= HARVEST_BATCH_SIZE:
+                await self._flush_user_buffer(collection_id)
+            return True
             
         except Exception as e:
             logger.error(f"Error saving collected user: {e}")
+            return False
     
-    async def _save_collected_group(self, collection_id, dialog):
-        """保存采集的群组/频道"""
-        try:
-            entity = dialog.entity
-            
-            # 检查是否已存在
-            existing = self.db[CollectedGroup.COLLECTION_NAME].find_one({
-                'collection_id': collection_id,
-                'group_id': entity.id
-            })
+    async def _save_collected_group(self, collection_id, entity, now=None):
+        """
+        保存采集的群组/频道
+        
+        Args:
+            collection_id: 采集任务ID
+            entity: Telethon 的 Channel / Chat 实体
             
-            if existing:
-                return
+        Returns:
+            bool: 是否为本任务新采集到的群组
+        """
+        try:
+            # 内存去重
+            seen = self._seen_groups.setdefault(str(collection_id), set())
+            if entity.id in seen:
+                return False
+            seen.add(entity.id)
             
             # 构建链接
             link = None
@@ -874,99 +1249,171 @@ class CollectionManager:
                 link=link,
                 member_count=getattr(entity, 'participants_count', 0),
                 is_public=bool(getattr(entity, 'username', None)),
-                description=getattr(entity, 'about', None) if hasattr(entity, 'about') else None
+                description=getattr(entity, 'about', None) if hasattr(entity, 'about') else None,
+                created_at=now
             )
             
-            # 保存到数据库
-            self.db[CollectedGroup.COLLECTION_NAME].insert_one(collected_group.to_dict())
+            # 写入缓冲，满一批再批量落库
+            buffer = self._group_buffers.setdefault(str(collection_id), [])
+            buffer.append(collected_group.to_dict())
+            if len(buffer) >= HARVEST_BATCH_SIZE:
+                await self._flush_group_buffer(collection_id)
+            return True
             
         except Exception as e:
             logger.error(f"Error saving collected group: {e}")
+            return False
+    
+    async def _flush_user_buffer(self, collection_id, acknowledged=False):
+        """将缓冲中的采集用户批量写入数据库（在线程池中执行，不阻塞事件循环）"""
+        docs = self._user_buffers.pop(str(collection_id), None)
+        if docs:
+            col = self.users_col if acknowledged else self.users_write
+            await self._db(CollectedUser.bulk_insert, col, docs)
+    
+    async def _flush_group_buffer(self, collection_id, acknowledged=False):
+        """将缓冲中的采集群组批量写入数据库"""
+        docs = self._group_buffers.pop(str(collection_id), None)
+        if docs:
+            col = self.groups_col if acknowledged else self.groups_write
+            await self._db(CollectedGroup.bulk_insert, col, docs)
+    
+    async def _flush_buffers(self, collection_id):
+        """写入某个采集任务的全部缓冲数据（采集结束时调用，使用确认写入）"""
+        try:
+            await self._flush_user_buffer(collection_id, acknowledged=True)
+            await self._flush_group_buffer(collection_id, acknowledged=True)
+        except Exception as e:
+            logger.error(f"Error flushing collected data for {collection_id}: {e}")
     
     def get_collection(self, collection_id):
         """获取采集任务"""
-        doc = self.db[Collection.COLLECTION_NAME].find_one({'_id': ObjectId(collection_id)})
+        doc = self.collections_col.find_one({'_id': ObjectId(collection_id)})
         return Collection.from_dict(doc)
     
     def list_collections(self, limit=20, skip=0):
         """列出采集任务"""
-        docs = self.db[Collection.COLLECTION_NAME].find().sort('created_at', -1).skip(skip).limit(limit)
+        docs = self.collections_read.find().sort('created_at', -1).skip(skip).limit(limit)
         return [Collection.from_dict(doc) for doc in docs]
     
-    def delete_collection(self, collection_id):
+    async def delete_collection(self, collection_id):
         """删除采集任务及其数据"""
+        oid = ObjectId(collection_id)
+        # 运行中的任务先停止并等待其结束，避免删除后仍有新批次写入留下孤立数据
+        if str(oid) in self.running_collections:
+            await self.stop_collection(collection_id)
         # 删除采集的用户
-        self.db[CollectedUser.COLLECTION_NAME].delete_many({'collection_id': ObjectId(collection_id)})
+        await self._db(self.users_col.delete_many, {'collection_id': oid})
         # 删除采集的群组
-        self.db[CollectedGroup.COLLECTION_NAME].delete_many({'collection_id': ObjectId(collection_id)})
+        await self._db(self.groups_col.delete_many, {'collection_id': oid})
         # 删除采集任务
-        self.db[Collection.COLLECTION_NAME].delete_one({'_id': ObjectId(collection_id)})
+        await self._db(self.collections_col.delete_one, {'_id': oid})
+        invalidate_menu_stats()
         logger.info(f"Deleted collection {collection_id}")
     
-    async def export_collected_users(self, collection_id):
-        """导出采集的用户列表"""
-        users = list(self.db[CollectedUser.COLLECTION_NAME].find({'collection_id': ObjectId(collection_id)}))
-        
-        result = []
-        for user_doc in users:
-            user = CollectedUser.from_dict(user_doc)
+    def iter_collected_users(self, collection_id):
+        """逐行产出采集用户的导出数据（投影查询 + 游标分批，不整体加载文档）"""
+        cursor = self.users_col.find(
+            {'collection_id': ObjectId(collection_id)},
+            {'_id': 0, 'user_id': 1, 'username': 1, 'first_name': 1, 'last_name': 1,
+             'is_premium': 1, 'is_admin': 1, 'has_photo': 1}
+        ).batch_size(EXPORT_BATCH_SIZE)
+        for doc in cursor:
             tags = []
-            if user.is_premium:
+            if doc.get('is_premium'):
                 tags.append('Premium')
-            if user.is_admin:
+            if doc.get('is_admin'):
                 tags.append('Admin')
-            if user.has_photo:
+            if doc.get('has_photo'):
                 tags.append('HasPhoto')
             
-            result.append({
-                'user_id': user.user_id,
-                'username': user.username or '',
-                'first_name': user.first_name or '',
-                'last_name': user.last_name or '',
+            yield {
+                'user_id': doc.get('user_id'),
+                'username': doc.get('username') or '',
+                'first_name': doc.get('first_name') or '',
+                'last_name': doc.get('last_name') or '',
                 'tags': ','.join(tags)
-            })
-        
-        return result
-    
-    async def export_collected_groups(self, collection_id):
-        """导出采集的群组列表"""
-        groups = list(self.db[CollectedGroup.COLLECTION_NAME].find({'collection_id': ObjectId(collection_id)}))
+            }
+    
+    def iter_collected_groups(self, collection_id):
+        """逐行产出采集群组的导出数据"""
+        cursor = self.groups_col.find(
+            {'collection_id': ObjectId(collection_id)},
+            {'_id': 0, 'group_id': 1, 'title': 1, 'username': 1, 'link': 1,
+             'member_count': 1, 'is_public': 1}
+        ).batch_size(EXPORT_BATCH_SIZE)
+        for doc in cursor:
+            yield {
+                'group_id': doc.get('group_id'),
+                'title': doc.get('title') or '',
+                'username': doc.get('username') or '',
+                'link': doc.get('link') or '',
+                'member_count': doc.get('member_count', 0),
+                'is_public': 'Yes' if doc.get('is_public', True) else 'No'
+            }
+    
+    async def export_collected_users(self, collection_id, fp):
+        """
+        将采集的用户以 CSV 逐行写入已打开的文本文件（在线程池中执行）
         
-        result = []
-        for group_doc in groups:
-            group = CollectedGroup.from_dict(group_doc)
-            result.append({
-                'group_id': group.group_id,
-                'title': group.title or '',
-                'username': group.username or '',
-                'link': group.link or '',
-                'member_count': group.member_count,
-                'is_public': 'Yes' if group.is_public else 'No'
-            })
+        Returns:
+            int: 写入的用户数
+        """
+        return await self._db(_write_csv_rows, fp, USER_EXPORT_FIELDS, self.iter_collected_users(collection_id))
+    
+    async def export_collected_groups(self, collection_id, fp):
+        """
+        将采集的群组以 CSV 逐行写入已打开的文本文件（在线程池中执行）
         
-        return result
+        Returns:
+            int: 写入的群组数
+        """
+        return await self._db(_write_csv_rows, fp, GROUP_EXPORT_FIELDS, self.iter_collected_groups(collection_id))
+
+
+def _write_csv_rows(fp, fieldnames, rows):
+    """写入表头与数据行，返回数据行数（同步阻塞）"""
+    writer = csv.DictWriter(fp, fieldnames=fieldnames)
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
 
 
 # ============================================================================
 # 数据库索引初始化
 # ============================================================================
 def init_collection_indexes(db):
-    """初始化采集相关的数据库索引"""
+    """初始化采集相关的数据库索引
+
+    每个集合的索引通过一次 createIndexes 提交；索引已存在时服务端直接返回，
+    重复启动不会重建。索引名沿用默认生成的名字，与已部署的索引保持一致。
+    """
     # Collection索引
-    db[Collection.COLLECTION_NAME].create_index('status')
-    db[Collection.COLLECTION_NAME].create_index('account_id')
-    db[Collection.COLLECTION_NAME].create_index('collection_type')
-    db[Collection.COLLECTION_NAME].create_index('created_at')
-    
-    # CollectedUser索引
-    db[CollectedUser.COLLECTION_NAME].create_index('collection_id')
-    db[CollectedUser.COLLECTION_NAME].create_index('user_id')
-    db[CollectedUser.COLLECTION_NAME].create_index([('collection_id', 1), ('user_id', 1)], unique=True)
+    db[Collection.COLLECTION_NAME].create_indexes([
+        IndexModel('status'),
+        IndexModel('account_id'),
+        IndexModel('collection_type'),
+        IndexModel('created_at'),
+        # 列表按 created_at 倒序分页，_id 作为同一时间戳下的稳定次序，排序可直接走索引
+        IndexModel([('created_at', -1), ('_id', -1)]),
+    ])
+    
+    # CollectedUser索引（唯一复合索引用于去重 upsert）
+    db[CollectedUser.COLLECTION_NAME].create_indexes([
+        IndexModel('collection_id'),
+        IndexModel('user_id'),
+        IndexModel([('collection_id', 1), ('user_id', 1)], unique=True),
+    ])
     
     # CollectedGroup索引
-    db[CollectedGroup.COLLECTION_NAME].create_index('collection_id')
-    db[CollectedGroup.COLLECTION_NAME].create_index('group_id')
-    db[CollectedGroup.COLLECTION_NAME].create_index([('collection_id', 1), ('group_id', 1)], unique=True)
+    db[CollectedGroup.COLLECTION_NAME].create_indexes([
+        IndexModel('collection_id'),
+        IndexModel('group_id'),
+        IndexModel([('collection_id', 1), ('group_id', 1)], unique=True),
+    ])
     
     logger.info("Collection indexes created")
 
@@ -985,28 +1432,119 @@ COLLECTION_FILTER_CONFIG = 5
 # ============================================================================
 # UI 界面函数
 # ============================================================================
+def _facet_counts(collection, match, branches):
+    """
+    用一次 $facet 聚合统计多个条件下的文档数
+    
+    Args:
+        collection: 要统计的集合
+        match: 所有分支共用的过滤条件（先于 $facet 执行，可走索引）
+        branches: {名称: 分支内的额外过滤条件，None 表示不再过滤}
+        
+    Returns:
+        dict: {名称: 文档数}
+    """
+    facet = {
+        name: ([{'$match': cond}] if cond else []) + [{'$count': 'n'}]
+        for name, cond in branches.items()
+    }
+    pipeline = ([{'$match': match}] if match else []) + [{'$facet': facet}]
+    result = next(collection.aggregate(pipeline), {})
+    return {name: result[name][0]['n'] if result.get(name) else 0 for name in branches}
+
+
+def _collection_task_counts(db):
+    """采集任务总数 / 运行中 / 已完成（一次聚合）"""
+    return _facet_counts(db[Collection.COLLECTION_NAME], None, {
+        'total': None,
+        'running': {'status': CollectionStatus.RUNNING.value},
+        'completed': {'status': CollectionStatus.COMPLETED.value}
+    })
+
+
+def _collection_account_counts(db):
+    """采集账户总数 / 可用数（一次聚合，只统计 collection 类型）"""
+    from bot import Account, AccountStatus
+    return _facet_counts(
+        db[Account.COLLECTION_NAME],
+        {'account_type': 'collection', 'session_format': {'$in': COLLECTION_SESSION_FORMATS}},
+        {'total': None, 'active': {'status': AccountStatus.ACTIVE.value}}
+    )
+
+
+async def _cached_menu_stats(key, compute, db):
+    """
+    带短时缓存的菜单统计；同一 key 的并发请求共用一次查询
+    
+    Args:
+        key: 缓存键
+        compute: 同步统计函数 compute(db)，在线程池中执行
+        db: 数据库实例
+    """
+    loop = asyncio.get_running_loop()
+    cached = _menu_stats_cache.get(key)
+    if cached and cached[0] > loop.time():
+        return cached[1]
+    
+    lock = _menu_stats_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        # 等锁期间可能已被其他请求刷新
+        cached = _menu_stats_cache.get(key)
+        if cached and cached[0] > loop.time():
+            return cached[1]
+        value = await asyncio.to_thread(compute, db)
+        _menu_stats_cache[key] = (loop.time() + MENU_STATS_TTL, value)
+        return value
+
+
+def invalidate_menu_stats():
+    """采集任务/账户变化后清空菜单统计缓存"""
+    _menu_stats_cache.clear()
+
+
+# 固定不变的菜单键盘在导入时构建一次，各次回调直接复用
+_COLLECTION_MENU_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📱 账户管理", callback_data='collection_accounts_menu')],
+    [InlineKeyboardButton("📋 采集列表", callback_data='collection_list')],
+    [InlineKeyboardButton("➕ 创建采集", callback_data='collection_create')],
+    [InlineKeyboardButton("🔙 返回主菜单", callback_data='back_main')]
+])
+_COLLECTION_ACCOUNTS_MENU_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📋 账号列表", callback_data='collection_accounts_list')],
+    [InlineKeyboardButton("➕ 添加账号", callback_data='collection_accounts_add')],
+    [InlineKeyboardButton("🔙 返回", callback_data='menu_collection')]
+])
+_EMPTY_ACCOUNT_LIST_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ 添加账户", callback_data='collection_accounts_add')],
+    [InlineKeyboardButton("🔙 返回", callback_data='collection_accounts_menu')]
+])
+_BACK_TO_COLLECTION_MENU_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔙 返回", callback_data='menu_collection')]
+])
+_BACK_TO_COLLECTION_LIST_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔙 返回", callback_data='collection_list')]
+])
+_EMPTY_COLLECTION_LIST_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ 创建采集", callback_data='collection_create')],
+    [InlineKeyboardButton("🔙 返回", callback_data='menu_collection')]
+])
+
+
 async def show_collection_menu(query):
     """显示采集菜单"""
-    from bot import Account, AccountStatus
-    
     # Use module-level _db
     db = _get_db()
     
-    # 统计采集任务
-    total_collections = db[Collection.COLLECTION_NAME].count_documents({})
-    running_collections = db[Collection.COLLECTION_NAME].count_documents({'status': CollectionStatus.RUNNING.value})
-    completed_collections = db[Collection.COLLECTION_NAME].count_documents({'status': CollectionStatus.COMPLETED.value})
-    
-    # 统计采集账户（只统计 collection 类型）
-    total_accounts = db[Account.COLLECTION_NAME].count_documents({
-        'account_type': 'collection',
-        'session_name': {'$regex': r'\.(session|session\+json)$'}
-    })
-    active_accounts = db[Account.COLLECTION_NAME].count_documents({
-        'status': AccountStatus.ACTIVE.value,
-        'account_type': 'collection',
-        'session_name': {'$regex': r'\.(session|session\+json)$'}
-    })
+    # 采集任务与采集账户的统计各一次聚合，两者并发执行
+    task_counts, account_counts = await asyncio.gather(
+        _cached_menu_stats('tasks', _collection_task_counts, db),
+        _cached_menu_stats('accounts', _collection_account_counts, db)
+    )
+    total_collections = task_counts['total']
+    running_collections = task_counts['running']
+    completed_collections = task_counts['completed']
+    total_accounts = account_counts['total']
+    active_accounts = account_counts['active']
     
     text = (
         "👥 <b>用户采集</b>\n\n"
@@ -1017,31 +1555,17 @@ async def show_collection_menu(query):
         "选择操作："
     )
     
-    keyboard = [
-        [InlineKeyboardButton("📱 账户管理", callback_data='collection_accounts_menu')],
-        [InlineKeyboardButton("📋 采集列表", callback_data='collection_list')],
-        [InlineKeyboardButton("➕ 创建采集", callback_data='collection_create')],
-        [InlineKeyboardButton("🔙 返回主菜单", callback_data='back_main')]
-    ]
-    
-    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    await query.edit_message_text(text, reply_markup=_COLLECTION_MENU_KB, parse_mode='HTML')
 
 
 async def show_collection_accounts_menu(query):
     """显示采集账户管理菜单"""
     db = _get_db()
-    from bot import Account, AccountStatus
     
     # 统计采集账户
-    total_accounts = db[Account.COLLECTION_NAME].count_documents({
-        'account_type': 'collection',
-        'session_name': {'$regex': r'\.(session|session\+json)$'}
-    })
-    active_accounts = db[Account.COLLECTION_NAME].count_documents({
-        'status': AccountStatus.ACTIVE.value,
-        'account_type': 'collection',
-        'session_name': {'$regex': r'\.(session|session\+json)$'}
-    })
+    account_counts = await _cached_menu_stats('accounts', _collection_account_counts, db)
+    total_accounts = account_counts['total']
+    active_accounts = account_counts['active']
     
     text = (
         "📱 <b>采集账户管理</b>\n\n"
@@ -1049,137 +1573,169 @@ async def show_collection_accounts_menu(query):
         f"请选择操作："
     )
     
-    keyboard = [
-        [InlineKeyboardButton("📋 账号列表", callback_data='collection_accounts_list')],
-        [InlineKeyboardButton("➕ 添加账号", callback_data='collection_accounts_add')],
-        [InlineKeyboardButton("🔙 返回", callback_data='menu_collection')]
-    ]
-    
-    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    await query.edit_message_text(text, reply_markup=_COLLECTION_ACCOUNTS_MENU_KB, parse_mode='HTML')
 
 
 async def list_collection_accounts(query):
     """显示采集账户列表"""
     db = _get_db()
-    from bot import Account, AccountStatus
+    from bot import Account
     
-    # 只查询 collection 类型的账户
-    account_docs = db[Account.COLLECTION_NAME].find({'account_type': 'collection'})
-    accounts = [Account.from_dict(doc) for doc in account_docs]
+    # 只查询 collection 类型的账户，且只取显示所需字段
+    account_filter = {'account_type': 'collection'}
+    accounts = await asyncio.to_thread(
+        list,
+        db[Account.COLLECTION_NAME].find(
+            account_filter, {'_id': 0, 'phone': 1, 'status': 1, 'session_format': 1}
+        ).limit(ACCOUNT_LIST_LIMIT)
+    )
+    # 未达到上限时条数即总数，否则再精确计数
+    total = len(accounts)
+    if total >= ACCOUNT_LIST_LIMIT:
+        total = await asyncio.to_thread(db[Account.COLLECTION_NAME].count_documents, account_filter)
     
     if not accounts:
         text = "📱 <b>采集账户列表</b>\n\n暂无采集账户"
-        keyboard = [
-            [InlineKeyboardButton("➕ 添加账户", callback_data='collection_accounts_add')],
-            [InlineKeyboardButton("🔙 返回", callback_data='collection_accounts_menu')]
-        ]
+        reply_markup = _EMPTY_ACCOUNT_LIST_KB
     else:
-        text = f"📱 <b>采集账户列表</b>\n\n共 {len(accounts)} 个采集账户：\n\n"
+        lines = [f"📱 <b>采集账户列表</b>\n\n共 {total} 个采集账户：\n\n"]
+        if total > len(accounts):
+            lines.append(f"（仅显示前 {len(accounts)} 个）\n\n")
         keyboard = []
         
         for account in accounts:
-            status_emoji = {'active': '✅', 'banned': '🚫', 'limited': '⚠️', 'inactive': '❌'}.get(account.status, '❓')
-            text += (
-                f"{status_emoji} <b>{account.phone}</b>\n"
-                f"   状态: {account.status}\n"
-                f"   格式: {account.session_name.split('.')[-1] if account.session_name else 'N/A'}\n\n"
+            status = account.get('status')
+            status_emoji = _ACCOUNT_STATUS_EMOJI.get(status, '❓')
+            lines.append(
+                f"{status_emoji} <b>{account.get('phone')}</b>\n"
+                f"   状态: {status}\n"
+                f"   格式: {account.get('session_format') or 'N/A'}\n\n"
             )
+        text = ''.join(lines)
         
         keyboard.append([InlineKeyboardButton("🔙 返回", callback_data='collection_accounts_menu')])
+        reply_markup = InlineKeyboardMarkup(keyboard)
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
 
 
-async def show_collection_list(query, page=0):
-    """显示采集任务列表"""
-    # Use module-level _db
+def _list_cursor(direction, page, coll_doc):
+    """构造分页按钮的回调数据：方向 + 目标页码 + 锚点文档的 (created_at 毫秒, _id)
+
+    MongoDB 日期只保存到毫秒，毫秒整数可无损还原为查询用的 datetime。
+    """
+    ts = (coll_doc['created_at'] - _EPOCH) // _MS
+    return f"collection_list_{direction}_{page}_{ts}_{coll_doc['_id']}"
+
+
+async def show_collection_list(query, page=0, direction=None, cursor_ts=None, cursor_id=None):
+    """显示采集任务列表
+
+    按 (created_at, _id) 倒序做键集分页：翻页按钮携带当前页首/尾条目的排序键，
+    查询从该位置沿索引继续读取，不再用 skip 丢弃前面的文档，深页与首页开销相同。
+    """
     db = _get_db()
-    limit = 5
-    skip = page * limit
-    
-    collections = list(db[Collection.COLLECTION_NAME].find().sort('created_at', -1).skip(skip).limit(limit))
-    total = db[Collection.COLLECTION_NAME].count_documents({})
+    limit = COLLECTION_PAGE_SIZE
+    collection = db[Collection.COLLECTION_NAME]
+    # 只取列表展示与分页锚点所需字段（_id 默认返回），不拉取 filters / error_message 等
+    projection = _COLLECTION_LIST_FIELDS
+    
+    def fetch_page():
+        if direction is None:
+            # 首页；多取一条用于判断是否还有下一页
+            docs = list(collection.find({}, projection).sort([('created_at', -1), ('_id', -1)]).limit(limit + 1))
+            return docs[:limit], len(docs) > limit, 0
+        
+        anchor_at = _EPOCH + cursor_ts * _MS
+        anchor_id = ObjectId(cursor_id)
+        if direction == 'n':
+            docs = list(collection.find({'$or': [
+                {'created_at': {'$lt': anchor_at}},
+                {'created_at': anchor_at, '_id': {'$lt': anchor_id}},
+            ]}, projection).sort([('created_at', -1), ('_id', -1)]).limit(limit + 1))
+            return docs[:limit], len(docs) > limit, page
+        
+        # 上一页：反向读取锚点之前的 limit 条再翻转回倒序
+        docs = list(collection.find({'$or': [
+            {'created_at': {'$gt': anchor_at}},
+            {'created_at': anchor_at, '_id': {'$gt': anchor_id}},
+        ]}, projection).sort([('created_at', 1), ('_id', 1)]).limit(limit))
+        if len(docs) < limit:
+            # 前面的任务被删除过，不足一整页时回到首页
+            docs = list(collection.find({}, projection).sort([('created_at', -1), ('_id', -1)]).limit(limit + 1))
+            return docs[:limit], len(docs) > limit, 0
+        docs.reverse()
+        return docs, True, page
+    
+    (collections, has_next, page), total = await asyncio.gather(
+        asyncio.to_thread(fetch_page),
+        # 无过滤条件的总数直接读集合元数据，无需扫描
+        asyncio.to_thread(collection.estimated_document_count),
+    )
     
     if not collections:
         text = "📋 <b>采集列表</b>\n\n暂无采集任务"
-        keyboard = [
-            [InlineKeyboardButton("➕ 创建采集", callback_data='collection_create')],
-            [InlineKeyboardButton("🔙 返回", callback_data='menu_collection')]
-        ]
+        reply_markup = _EMPTY_COLLECTION_LIST_KB
     else:
-        text = f"📋 <b>采集列表</b> (第 {page + 1} 页，共 {(total + limit - 1) // limit} 页)\n\n"
+        lines = [f"📋 <b>采集列表</b> (第 {page + 1} 页，共 {max((total + limit - 1) // limit, page + 1)} 页)\n\n"]
         keyboard = []
         
         for coll_doc in collections:
-            coll = Collection.from_dict(coll_doc)
-            status_emoji = {
-                'pending': '⏸️',
-                'running': '🔄',
-                'paused': '⏸️',
-                'completed': '✅',
-                'failed': '❌'
-            }.get(coll.status, '❓')
+            name = coll_doc.get('name')
+            status_emoji = _STATUS_EMOJI.get(coll_doc.get('status'), '❓')
             
-            type_name = {
-                'public_group': '公开群组',
-                'private_group': '私有群组',
-                'channel_post': '频道帖子',
-                'channel_comment': '频道评论',
-                'keyword_search': '关键词搜索'
-            }.get(coll.collection_type, '未知')
+            type_name = _TYPE_NAME.get(coll_doc.get('collection_type'), '未知')
             
-            text += (
-                f"{status_emoji} <b>{coll.name}</b>\n"
-                f"   类型: {type_name} | 用户: {coll.collected_users} | 群组: {coll.collected_groups}\n\n"
+            lines.append(
+                f"{status_emoji} <b>{name}</b>\n"
+                f"   类型: {type_name} | 用户: {coll_doc.get('collected_users', 0)} | 群组: {coll_doc.get('collected_groups', 0)}\n\n"
             )
             
             keyboard.append([
-                InlineKeyboardButton(f"📊 {coll.name}", callback_data=f'collection_detail_{str(coll._id)}')
+                InlineKeyboardButton(f"📊 {name}", callback_data=f"collection_detail_{coll_doc['_id']}")
             ])
+        text = ''.join(lines)
         
         # 分页按钮
         nav_buttons = []
         if page > 0:
-            nav_buttons.append(InlineKeyboardButton("⬅️ 上一页", callback_data=f'collection_list_{page - 1}'))
-        if (page + 1) * limit < total:
-            nav_buttons.append(InlineKeyboardButton("➡️ 下一页", callback_data=f'collection_list_{page + 1}'))
+            nav_buttons.append(InlineKeyboardButton(
+                "⬅️ 上一页", callback_data=_list_cursor('p', page - 1, collections[0])))
+        if has_next:
+            nav_buttons.append(InlineKeyboardButton(
+                "➡️ 下一页", callback_data=_list_cursor('n', page + 1, collections[-1])))
         
         if nav_buttons:
             keyboard.append(nav_buttons)
         
         keyboard.append([InlineKeyboardButton("🔙 返回", callback_data='menu_collection')])
+        reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
 
 
 async def show_collection_detail(query, collection_id):
     """显示采集任务详情"""
     from bson import ObjectId
-    # Use module-level _db
+    # 调用方已应答 callback query，错误提示改为编辑消息
+    if not ObjectId.is_valid(collection_id):
+        # callback_data 格式错误时直接拒绝，不访问数据库
+        await query.edit_message_text("❌ 无效的采集任务 ID", reply_markup=_BACK_TO_COLLECTION_LIST_KB)
+        return
+    oid = ObjectId(collection_id)
     db = _get_db()
-    coll_doc = db[Collection.COLLECTION_NAME].find_one({'_id': ObjectId(collection_id)})
+    coll_doc = await asyncio.to_thread(
+        db[Collection.COLLECTION_NAME].find_one, {'_id': oid}, _COLLECTION_DETAIL_FIELDS
+    )
     if not coll_doc:
-        await query.answer("❌ 采集任务不存在", show_alert=True)
+        await query.edit_message_text("❌ 采集任务不存在", reply_markup=_BACK_TO_COLLECTION_LIST_KB)
         return
     
     coll = Collection.from_dict(coll_doc)
     
-    status_emoji = {
-        'pending': '⏸️',
-        'running': '🔄',
-        'paused': '⏸️',
-        'completed': '✅',
-        'failed': '❌'
-    }.get(coll.status, '❓')
+    status_emoji = _STATUS_EMOJI.get(coll.status, '❓')
     
-    type_name = {
-        'public_group': '公开群组',
-        'private_group': '私有群组',
-        'channel_post': '频道帖子',
-        'channel_comment': '频道评论',
-        'keyword_search': '关键词搜索'
-    }.get(coll.collection_type, '未知')
+    type_name = _TYPE_NAME.get(coll.collection_type, '未知')
     
     text = (
         f"📊 <b>采集详情</b>\n\n"
@@ -1286,10 +1842,10 @@ async def handle_collection_type(update, context):
     
     # 获取采集专用账户（只显示 collection 类型的 session 格式账户）
     db = _get_db()
-    accounts = list(db[Account.COLLECTION_NAME].find({
+    accounts = await asyncio.to_thread(list, db[Account.COLLECTION_NAME].find({
         'status': AccountStatus.ACTIVE.value,
         'account_type': 'collection',
-        'session_name': {'$regex': r'\.(session|session\+json)$'}
+        'session_format': {'$in': COLLECTION_SESSION_FORMATS}
     }).limit(10))
     
     if not accounts:
@@ -1328,18 +1884,23 @@ async def handle_collection_type(update, context):
 async def handle_collection_account(update, context):
     """处理账户选择"""
     query = update.callback_query
-    await query.answer()
     from bot import Account
     from bson import ObjectId
     
+    # callback query 只能应答一次：先校验，无效时用提示框应答
     account_id = query.data.replace('coll_account_', '')
+    if not ObjectId.is_valid(account_id):
+        await query.answer("❌ 无效的账户 ID", show_alert=True)
+        return ConversationHandler.END
+    await query.answer()
+    account_oid = ObjectId(account_id)
     context.user_data['collection_account_id'] = account_id
     
     # 获取账户信息
     db = _get_db()
-    acc_doc = db[Account.COLLECTION_NAME].find_one({'_id': ObjectId(account_id)})
+    acc_doc = await asyncio.to_thread(db[Account.COLLECTION_NAME].find_one, {'_id': account_oid})
     if not acc_doc:
-        await query.answer("❌ 账户不存在", show_alert=True)
+        await query.edit_message_text("❌ 账户不存在", reply_markup=_BACK_TO_COLLECTION_MENU_KB)
         return ConversationHandler.END
     
     acc = Account.from_dict(acc_doc)
@@ -1478,14 +2039,21 @@ async def toggle_filter(update, context):
 async def create_collection_now(update, context):
     """立即创建采集任务"""
     query = update.callback_query
-    await query.answer()
     from bson import ObjectId
     
+    # 会话数据丢失时 account_id 为 None，ObjectId(None) 会静默生成新 ID，需在这里拦下；
+    # callback query 只能应答一次，所以校验放在应答之前
+    account_id = context.user_data.get('collection_account_id')
+    if not ObjectId.is_valid(account_id):
+        await query.answer("❌ 无效的账户 ID", show_alert=True)
+        return ConversationHandler.END
+    await query.answer()
+    account_oid = ObjectId(account_id)
+    
     try:
         collection_manager = _get_collection_manager()
         name = context.user_data.get('collection_name')
         coll_type = context.user_data.get('collection_type')
-        account_id = context.user_data.get('collection_account_id')
         target = context.user_data.get('collection_target')
         keyword = context.user_data.get('collection_keyword')
         filters = context.user_data.get('collection_filters', {})
@@ -1494,7 +2062,7 @@ async def create_collection_now(update, context):
         collection = await collection_manager.create_collection(
             name=name,
             collection_type=coll_type,
-            account_id=ObjectId(account_id),
+            account_id=account_oid,
             target_link=target,
             keyword=keyword,
             filters=filters
@@ -5,34 +5,96 @@ Test script to verify force private mode implementation
 
 import sys
 import ast
-import re
 
 
-def test_no_retry_in_force_mode():
-    """Verify that force mode disables retry logic"""
+def _load_bot():
+    """Parse bot.py once and index its functions by name"""
     with open('bot.py', 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Find _send_message function (flexible indentation pattern)
-    match = re.search(
-        r'async def _send_message\(self, task, target, account\):.*?(?=\n\s{0,4}async def |\n\s{0,4}class |\Z)',
-        content,
-        re.DOTALL
+        source = f.read()
+    tree = ast.parse(source)
+    functions = {}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions.setdefault(node.name, node)
+    return source, tree, functions
+
+
+BOT_SOURCE, BOT_TREE, BOT_FUNCTIONS = _load_bot()
+
+
+def _async_function(name):
+    """Return the async function node with the given name, or None"""
+    node = BOT_FUNCTIONS.get(name)
+    return node if isinstance(node, ast.AsyncFunctionDef) else None
+
+
+def _mentions(node, name):
+    """Whether name appears under node as a variable, attribute or string constant"""
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name) and child.id == name:
+            return True
+        if isinstance(child, ast.Attribute) and child.attr == name:
+            return True
+        if isinstance(child, ast.Constant) and child.value == name:
+            return True
+    return False
+
+
+def _string_constants(node):
+    """All string literals under node"""
+    return {child.value for child in ast.walk(node)
+            if isinstance(child, ast.Constant) and isinstance(child.value, str)}
+
+
+def _assigns(node, name, value):
+    """Whether node contains `name = value`"""
+    return any(
+        isinstance(child, ast.Assign)
+        and any(isinstance(t, ast.Name) and t.id == name for t in child.targets)
+        and isinstance(child.value, ast.Constant) and child.value.value == value
+        for child in ast.walk(node)
+    )
+
+
+def _increments(node, name):
+    """Whether node contains `name += 1`"""
+    return any(
+        isinstance(child, ast.AugAssign) and isinstance(child.op, ast.Add)
+        and isinstance(child.target, ast.Name) and child.target.id == name
+        and isinstance(child.value, ast.Constant) and child.value.value == 1
+        for child in ast.walk(node)
     )
+
+
+def _calls_attribute(node, owner, attr):
+    """Whether node contains a call to owner.attr(...)"""
+    return any(
+        isinstance(child, ast.Call) and isinstance(child.func, ast.Attribute)
+        and child.func.attr == attr
+        and isinstance(child.func.value, ast.Name) and child.func.value.id == owner
+        for child in ast.walk(node)
+    )
+
+
+def test_no_retry_in_force_mode():
+    """Verify that force mode disables retry logic"""
+    function = _async_function('_send_message')
     
-    if not match:
+    if function is None:
         print("❌ FAIL: Could not find _send_message function")
         return False
     
-    function_code = match.group(0)
-    
     # Check for force_private_mode check
-    if 'force_private_mode' not in function_code:
+    if not _mentions(function, 'force_private_mode'):
         print("❌ FAIL: _send_message does not check force_private_mode")
         return False
     
     # Check that retry_count is set to 0 when force_private_mode is True
-    if not re.search(r'if.*force_private_mode.*:\s*retry_count\s*=\s*0', function_code, re.DOTALL):
+    if not any(
+        isinstance(child, ast.If) and _mentions(child.test, 'force_private_mode')
+        and any(_assigns(stmt, 'retry_count', 0) for stmt in child.body)
+        for child in ast.walk(function)
+    ):
         print("❌ FAIL: _send_message does not set retry_count=0 for force_private_mode")
         return False
     
@@ -42,17 +104,18 @@ def test_no_retry_in_force_mode():
 
 def test_default_consecutive_limit():
     """Verify that DEFAULT_CONSECUTIVE_FAILURE_LIMIT is set to 10"""
-    with open('bot.py', 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    match = re.search(r'DEFAULT_CONSECUTIVE_FAILURE_LIMIT\s*=\s*(\d+)', content)
-    
-    if not match:
+    limit = None
+    for node in BOT_TREE.body:
+        if (isinstance(node, ast.Assign)
+                and any(isinstance(t, ast.Name) and t.id == 'DEFAULT_CONSECUTIVE_FAILURE_LIMIT' for t in node.targets)
+                and isinstance(node.value, ast.Constant)):
+            limit = node.value.value
+            break
+    
+    if limit is None:
         print("❌ FAIL: Could not find DEFAULT_CONSECUTIVE_FAILURE_LIMIT")
         return False
     
-    limit = int(match.group(1))
-    
     if limit != 10:
         print(f"❌ FAIL: DEFAULT_CONSECUTIVE_FAILURE_LIMIT is {limit}, expected 10")
         return False
@@ -63,62 +126,36 @@ def test_default_consecutive_limit():
 
 def test_force_mode_implementation():
     """Verify that _execute_force_send_mode exists and uses asyncio.gather"""
-    with open('bot.py', 'r', encoding='utf-8') as f:
-        content = f.read()
+    function = _async_function('_execute_force_send_mode')
     
     # Check for _execute_force_send_mode function
-    if 'async def _execute_force_send_mode' not in content:
+    if function is None:
         print("❌ FAIL: _execute_force_send_mode function not found")
         return False
     
-    # Find the function (flexible indentation pattern)
-    match = re.search(
-        r'async def _execute_force_send_mode\(.*?\):.*?(?=\n\s{0,4}async def |\n\s{0,4}class |\Z)',
-        content,
-        re.DOTALL
-    )
-    
-    if not match:
-        print("❌ FAIL: Could not parse _execute_force_send_mode function")
-        return False
-    
-    function_code = match.group(0)
-    
     # Check for asyncio.gather (multi-threading)
-    if 'asyncio.gather' not in function_code:
+    if not _calls_attribute(function, 'asyncio', 'gather'):
         print("❌ FAIL: _execute_force_send_mode does not use asyncio.gather for concurrency")
         return False
     
     # Check for _process_account_force_mode (the function that handles each account)
-    if 'async def _process_account_force_mode' not in content:
+    account_function = _async_function('_process_account_force_mode')
+    if account_function is None:
         print("❌ FAIL: _process_account_force_mode function not found")
         return False
     
-    # Find _process_account_force_mode (flexible indentation pattern)
-    match = re.search(
-        r'async def _process_account_force_mode\(.*?\):.*?(?=\n\s{0,4}async def |\n\s{0,4}class |\Z)',
-        content,
-        re.DOTALL
-    )
-    
-    if not match:
-        print("❌ FAIL: Could not parse _process_account_force_mode function")
-        return False
-    
-    account_function_code = match.group(0)
-    
     # Check for consecutive failure logic in _process_account_force_mode
-    if 'consecutive_failures' not in account_function_code.lower():
+    if not _mentions(account_function, 'consecutive_failures'):
         print("❌ FAIL: _process_account_force_mode does not implement consecutive failure tracking")
         return False
     
     # Check that counter resets on success
-    if 'consecutive_failures = 0' not in account_function_code:
+    if not _assigns(account_function, 'consecutive_failures', 0):
         print("❌ FAIL: _process_account_force_mode does not reset consecutive_failures on success")
         return False
     
     # Check that counter increments on failure
-    if 'consecutive_failures += 1' not in account_function_code:
+    if not _increments(account_function, 'consecutive_failures'):
         print("❌ FAIL: _process_account_force_mode does not increment consecutive_failures on failure")
         return False
     
@@ -128,43 +165,27 @@ def test_force_mode_implementation():
 
 def test_spambot_checking():
     """Verify that @spambot checking is implemented"""
-    with open('bot.py', 'r', encoding='utf-8') as f:
-        content = f.read()
+    function = _async_function('check_account_real_status')
     
     # Check for check_account_real_status function
-    if 'async def check_account_real_status' not in content:
+    if function is None:
         print("❌ FAIL: check_account_real_status function not found")
         return False
     
     # Check for @spambot query
-    if 'spambot' not in content.lower():
+    if 'spambot' not in BOT_SOURCE.lower():
         print("❌ FAIL: No reference to spambot found")
         return False
     
-    # Find check_account_real_status function (flexible indentation pattern)
-    match = re.search(
-        r'async def check_account_real_status\(.*?\):.*?(?=\n\s{0,4}async def |\n\s{0,4}class |\Z)',
-        content,
-        re.DOTALL
-    )
-    
-    if not match:
-        print("❌ FAIL: Could not parse check_account_real_status function")
-        return False
-    
-    function_code = match.group(0)
+    strings = _string_constants(function)
     
     # Check for /start command to spambot
-    if '/start' not in function_code:
+    if '/start' not in strings:
         print("❌ FAIL: check_account_real_status does not send /start to spambot")
         return False
     
     # Check for status detection (active, limited, banned)
-    has_active = 'active' in function_code
-    has_limited = 'limited' in function_code
-    has_banned = 'banned' in function_code
-    
-    if not (has_active and has_limited and has_banned):
+    if not {'active', 'limited', 'banned'} <= strings:
         print("❌ FAIL: check_account_real_status does not check for all statuses (active, limited, banned)")
         return False
     
@@ -6,11 +6,17 @@ Validation script to check implementation completeness
 import sys
 import ast
 import re
+import functools
+
+@functools.lru_cache(maxsize=1)
+def _bot_source():
+    """Read bot.py once; every check shares the same text"""
+    with open('bot.py', 'r', encoding='utf-8') as f:
+        return f.read()
 
 def check_bot_py():
     """Check bot.py for implemented features"""
-    with open('bot.py', 'r', encoding='utf-8') as f:
-        content = f.read()
+    content = _bot_source()
     
     checks = {
         'Multi-threading with asyncio.gather': 'asyncio.gather' in content,
@@ -81,9 +87,7 @@ def check_syntax():
     print("=" * 70)
     
     try:
-        with open('bot.py', 'r', encoding='utf-8') as f:
-            code = f.read()
-        ast.parse(code)
+        ast.parse(_bot_source())
         print("✅ PASS - bot.py has valid Python syntax")
         print("=" * 70)
         return 0